@@ -1,122 +1,166 @@
-from sql_alchemy import db, UserWordMastery, UserAchievement, User
-from datetime import datetime, timedelta, date
+import threading
+import time
+from collections import OrderedDict
 
+from sqlalchemy import select, update, func, distinct
 
-def calculate_streak(user_id):
-    # 获取用户所有学习日期（去重并转换为date对象）
-    date_records = db.session.query(
-        db.func.DATE(UserWordMastery.created_at).label('learning_date')
-    ).filter(
-        UserWordMastery.user_id == user_id
-    ).distinct().all()
+from crud.activity_calendar import get_streak, build_missing_calendars, prune_daily_counts
+from crud.user_profile import get_or_build_profile
+from sql_alchemy import db, UserWordMastery, UserAchievement, User, UserActivityCalendar, UserDailyCount
+from datetime import datetime, date, timedelta
 
-    # 提取日期并转换为date对象
-    dates = []
-    for record in date_records:
-        try:
-            # 如果数据库返回的是字符串
-            if isinstance(record.learning_date, str):
-                date_obj = datetime.strptime(record.learning_date, '%Y-%m-%d').date()
-            # 如果数据库返回的是date对象
-            elif isinstance(record.learning_date, date):
-                date_obj = record.learning_date
-            # 如果数据库返回的是datetime对象
-            else:
-                date_obj = record.learning_date.date()
-            dates.append(date_obj)
-        except Exception as e:
-            continue
 
-    # 按日期降序排序
-    dates.sort(reverse=True)
+# 成就规则: metric 为判断所用的指标，达到 threshold 即解锁
+ACHIEVEMENT_RULES = [
+    {'name': '坚持不懈', 'metric': 'streak', 'threshold': 30},  # 连续学习30天
+    {'name': '词汇大师', 'metric': 'total', 'threshold': 500},  # 掌握500个单词
+    {'name': '速记能手', 'metric': 'daily', 'threshold': 50},  # 单日记忆50个单词
+    {'name': '突破极限', 'metric': 'streak', 'threshold': 100},  # 连续学习100天
+]
 
-    # 计算连续天数
-    streak = 0
-    today = date.today()
-    prev_date = today
+# 每日计数只用于判断单日规则，保留今天和昨天(跨午夜的请求)，更早的由每日任务清理
+DAILY_COUNT_RETENTION_DAYS = 2
 
-    for current_date in dates:
-        delta = prev_date - current_date
-        if delta.days == 1 or streak == 0:  # 连续或第一天
-            streak += 1
-            prev_date = current_date
-        else:
-            break
 
-    return streak
+def _qualified_users_sql(metric, threshold, lo, hi, day):
+    """返回 user_id 在 [lo, hi] 内、满足规则的用户子查询"""
+    if metric == 'streak':
+        return select(UserActivityCalendar.user_id).where(
+            UserActivityCalendar.user_id.between(lo, hi),
+            UserActivityCalendar.current_streak >= threshold
+        )
+    query = select(UserWordMastery.user_id).where(UserWordMastery.user_id.between(lo, hi))
+    if metric == 'daily':
+        start = datetime.combine(day, datetime.min.time())
+        query = query.where(
+            UserWordMastery.created_at >= start,
+            UserWordMastery.created_at < start + timedelta(days=1)
+        )
+        return query.group_by(UserWordMastery.user_id).having(func.count() >= threshold)
+    # 与资料快照一致，按不同的单词计数
+    return query.group_by(UserWordMastery.user_id).having(func.count(distinct(UserWordMastery.word_id)) >= threshold)
 
-def daily_achievement_check():
-    users = User.query.all()
-    for user in users:
-        AchievementService.check_achievements(user.id)
 
-class AchievementService:
-    @staticmethod
-    def check_achievements(user_id):
-        """检查并更新用户成就状态"""
-        achievements = [
-            {
-                'name': '坚持不懈', # 连续学习30天
-                'check_func': AchievementService.check_30day_streak
-            },
-            {
-                'name': '词汇大师', # 掌握500个单词
-                'check_func': AchievementService.check_500_words
-            },
-            {
-                'name': '速记能手', # 单日记忆50个单词
-                'check_func': AchievementService.check_50_words_daily
-            },
-            {
-                'name': '突破极限', # 连续学习100天
-                'check_func': AchievementService.check_100day_streak
-            }
-        ]
-
-        for achievement in achievements:
-            if not UserAchievement.query.filter_by(
-                    user_id=user_id,
-                    name=achievement['name'],
-                    is_active=True
-            ).first():
-                if achievement['check_func'](user_id):
-                    AchievementService.unlock_achievement(
-                        user_id,
-                        achievement['name']
+def daily_achievement_check(app, chunk_size=500, day=None):
+    """
+    每日成就批量检查
+    按 user_id 分段处理，每段对每条规则执行一条聚合 + 批量更新语句，内存占用与用户总数无关
+    day: 检查单日记忆数所用的日期，默认是刚结束的前一天(任务在午夜运行)
+    """
+    with app.app_context():
+        day = day or date.today() - timedelta(days=1)
+        started = time.perf_counter()
+        stats = {'users': 0, 'chunks': 0, 'calendars_built': 0, 'unlocked': {rule['name']: 0 for rule in ACHIEVEMENT_RULES}}
+        last_user_id = 0
+        while True:
+            user_ids = db.session.execute(
+                select(User.user_id).where(User.user_id > last_user_id).order_by(User.user_id).limit(chunk_size)
+            ).scalars().all()
+            if not user_ids:
+                break
+            lo, hi = user_ids[0], user_ids[-1]
+            try:
+                stats['calendars_built'] += build_missing_calendars(lo, hi)
+                for rule in ACHIEVEMENT_RULES:
+                    result = db.session.execute(
+                        update(UserAchievement)
+                        .where(
+                            UserAchievement.user_id.between(lo, hi),
+                            UserAchievement.name == rule['name'],
+                            UserAchievement.is_active == False,
+                            UserAchievement.user_id.in_(_qualified_users_sql(rule['metric'], rule['threshold'], lo, hi, day))
+                        )
+                        .values(is_active=True)
+                        .execution_options(synchronize_session=False)
                     )
+                    stats['unlocked'][rule['name']] += result.rowcount
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"每日成就检查失败 - 用户ID {lo}~{hi}: {str(e)}")
+            stats['users'] += len(user_ids)
+            stats['chunks'] += 1
+            last_user_id = hi
 
-    @staticmethod
-    def unlock_achievement(user_id, name):
-        """解锁成就"""
-        achievement = UserAchievement.query.filter_by(user_id=user_id, name=name).first()
-        if achievement:
-            achievement.is_active = True
+        try:
+            stats['daily_counts_pruned'] = prune_daily_counts(date.today() - timedelta(days=DAILY_COUNT_RETENTION_DAYS - 1))
             db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"清理每日计数失败: {str(e)}")
+
+        stats['duration'] = round(time.perf_counter() - started, 3)
+        stats['users_per_second'] = round(stats['users'] / stats['duration']) if stats['duration'] else stats['users']
+        app.logger.info(f"每日成就检查完成: {stats}")
+        return stats
+
+
+class AchievementService:
+    # 每个进程缓存用户已解锁的成就名；成就只会解锁不会撤销，缓存无需失效
+    _unlocked_cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    _cache_size = 10000
 
     @staticmethod
-    def check_30day_streak(user_id):
-        """检查连续学习30天"""
-        streak = calculate_streak(user_id)  # 您的连续天数计算函数
-        return streak >= 30
+    def check_achievements(user_id, counters=None):
+        """
+        检查并更新用户成就状态，返回本次解锁的成就名
+        counters 由写入路径(record_mastery)直接给出时，所有规则都在内存中判断，
+        只有真正解锁成就时才会访问数据库
+        """
+        unlocked = AchievementService._get_unlocked(user_id)
+        pending = [rule for rule in ACHIEVEMENT_RULES if rule['name'] not in unlocked]
+        if not pending:
+            return []
+
+        if counters is None:
+            counters = AchievementService.load_counters(user_id)
+        names = [rule['name'] for rule in pending if counters[rule['metric']] >= rule['threshold']]
+        if names:
+            AchievementService.unlock_achievements(user_id, names)
+        return names
 
     @staticmethod
-    def check_500_words(user_id):
-        """检查掌握500个单词"""
-        word_count = UserWordMastery.query.filter_by(user_id=user_id).count()
-        return word_count >= 500
+    def load_counters(user_id):
+        """没有现成计数器时从资料快照、学习日历和每日计数中读取"""
+        daily = db.session.query(UserDailyCount.word_count).filter_by(
+            user_id=user_id,
+            learning_date=date.today()
+        ).scalar()
+        return {
+            'total': get_or_build_profile(user_id).mastery_word_count,
+            'daily': daily or 0,
+            'streak': get_streak(user_id),
+        }
 
     @staticmethod
-    def check_50_words_daily(user_id):
-        """检查单日记忆50个单词"""
-        today = datetime.now().date()
-        count = UserWordMastery.query.filter(
-            UserWordMastery.user_id == user_id,
-            db.func.DATE(UserWordMastery.created_at) == today
-        ).count()
-        return count >= 50
+    def unlock_achievements(user_id, names):
+        """解锁成就"""
+        UserAchievement.query.filter(
+            UserAchievement.user_id == user_id,
+            UserAchievement.name.in_(names),
+            UserAchievement.is_active == False
+        ).update({UserAchievement.is_active: True}, synchronize_session=False)
+        db.session.commit()
+        with AchievementService._cache_lock:
+            cached = AchievementService._unlocked_cache.get(user_id)
+            if cached is not None:
+                cached.update(names)
 
     @staticmethod
-    def check_100day_streak(user_id):
-        """检查连续学习100天"""
-        streak = calculate_streak(user_id)  # 您的连续天数计算函数
-        return streak >= 100
\ No newline at end of file
+    def _get_unlocked(user_id):
+        with AchievementService._cache_lock:
+            cached = AchievementService._unlocked_cache.get(user_id)
+            if cached is not None:
+                AchievementService._unlocked_cache.move_to_end(user_id)
+                return cached
+
+        names = {name for (name,) in db.session.query(UserAchievement.name).filter_by(
+            user_id=user_id,
+            is_active=True
+        )}
+        with AchievementService._cache_lock:
+            AchievementService._unlocked_cache[user_id] = names
+            if len(AchievementService._unlocked_cache) > AchievementService._cache_size:
+                AchievementService._unlocked_cache.popitem(last=False)
+        return names
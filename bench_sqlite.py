@@ -0,0 +1,116 @@
+# SQLite 引擎配置压测: 对比 SQLITE_PROFILES 中各配置在并发读写下的吞吐
+# 用法: python bench_sqlite.py [每轮秒数]
+# 模拟线上 2 个 worker 进程、每个进程多个并发请求，在临时数据库上分别跑读多写少和纯写两种负载
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, func, insert
+from sqlalchemy.orm import Session
+
+from migrations import run_migrations
+from sql_alchemy import SQLITE_PROFILES, apply_sqlite_pragmas, User, Word, UserWordMastery
+
+WORKERS = 2
+THREADS_PER_WORKER = 16
+USERS = 200
+WORDS = 5000
+
+
+def make_engine(path, profile):
+    engine = create_engine(f'sqlite:///{path}', **SQLITE_PROFILES[profile]['engine_options'])
+    apply_sqlite_pragmas(engine, SQLITE_PROFILES[profile]['pragmas'])
+    return engine
+
+
+def seed(path, profile):
+    engine = make_engine(path, profile)
+    run_migrations(engine)
+    with Session(engine) as session:
+        session.execute(insert(User), [{
+            'user_id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'wechat_openid': f'openid{i}',
+            'wechat_session_key': 'key', 'preferred_classification': 'CET4', 'wallet_key': f'wallet{i}'
+        } for i in range(1, USERS + 1)])
+        session.execute(insert(Word), [{
+            'word_id': i, 'word_en': f'word{i}', 'word_cn': '[]', 'example_sentense_en': '', 'example_sentense_cn': '',
+            'usphone': '', 'classification': 'CET4'
+        } for i in range(1, WORDS + 1)])
+        session.commit()
+    engine.dispose()
+
+
+def read_op(session, rng):
+    user_id = rng.randint(1, USERS)
+    session.execute(select(func.count()).select_from(UserWordMastery).where(
+        UserWordMastery.user_id == user_id, UserWordMastery.word_type == 'CET4', UserWordMastery.is_mastered == 1
+    )).scalar()
+    session.execute(select(Word).where(Word.classification == 'CET4', Word.word_id > rng.randint(0, WORDS)).limit(10)).all()
+    session.rollback()
+
+
+def write_op(session, rng):
+    session.execute(insert(UserWordMastery).values(
+        user_id=rng.randint(1, USERS), word_id=rng.randint(1, WORDS), word_type='CET4',
+        created_at=datetime.now(), is_mastered=1
+    ))
+    session.commit()
+
+
+def worker(path, profile, write_ratio, duration, results):
+    engine = make_engine(path, profile)
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def run(seed_value):
+        rng = random.Random(seed_value)
+        while time.time() < deadline:
+            is_write = rng.random() < write_ratio
+            try:
+                with Session(engine) as session:
+                    (write_op if is_write else read_op)(session, rng)
+                with lock:
+                    counts['writes' if is_write else 'reads'] += 1
+            except Exception:
+                with lock:
+                    counts['errors'] += 1
+
+    threads = [threading.Thread(target=run, args=(os.getpid() * 100 + i,)) for i in range(THREADS_PER_WORKER)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    results.put(counts)
+
+
+def bench(profile, write_ratio, duration):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bench.sqlite3')
+        seed(path, profile)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, profile, write_ratio, duration, results))
+                     for _ in range(WORKERS)]
+        for process in processes:
+            process.start()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+    return {key: round(value / duration) for key, value in totals.items()}
+
+
+if __name__ == '__main__':
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{WORKERS} 个进程 x {THREADS_PER_WORKER} 个线程，每轮 {duration} 秒，单位: 次/秒")
+    for name, write_ratio in [('读多写少(10%写)', 0.1), ('纯写', 1.0)]:
+        for profile in SQLITE_PROFILES:
+            result = bench(profile, write_ratio, duration)
+            print(f"{name:<12} {profile:<12} 读 {result['reads']:>7}  写 {result['writes']:>7}  失败 {result['errors']:>5}")
@@ -0,0 +1,73 @@
+# 检查各接口的热点查询是否走索引
+# 用法: python check_query_plans.py [数据库文件]
+# 不传数据库文件时按模型在内存中建库；任何一条查询出现全表扫描即以非零状态退出
+import sys
+
+from sqlalchemy import create_engine
+
+from migrations import run_migrations
+
+# (接口, 查询语句)，参数用占位值即可
+QUERY_PLAN_CHECKS = [
+    ('/api/wxlogin', "SELECT * FROM user WHERE wechat_openid = 'x' AND is_deleted = 0"),
+    ('/api/words 已掌握数', "SELECT mastered_count, unknown_count FROM user_classification_progress "
+                        "WHERE user_id = 1 AND classification = 'CET4'"),
+    ('/api/words 下一批单词', "SELECT * FROM word WHERE classification = 'CET4' AND word_id > 0 AND NOT EXISTS ("
+                         "SELECT 1 FROM user_word_mastery WHERE user_id = 1 AND word_id = word.word_id) "
+                         "ORDER BY word_id LIMIT 10"),
+    ('/api/word/mark-mastered', "SELECT * FROM user_word_mastery WHERE user_id = 1 AND word_id = 1 AND word_type = 'CET4'"),
+    ('/api/today_mastered_words', "SELECT count(*) FROM user_word_mastery WHERE user_id = 1 "
+                                  "AND created_at BETWEEN '2024-01-01 00:00:00' AND '2024-01-01 23:59:59'"),
+    ('/api/get_today_learned_words', "SELECT word.word_en, word.word_cn FROM user_word_mastery "
+                                     "JOIN word ON user_word_mastery.word_id = word.word_id WHERE user_word_mastery.user_id = 1 "
+                                     "AND user_word_mastery.created_at BETWEEN '2024-01-01 00:00:00' AND '2024-01-01 23:59:59'"),
+    ('/api/unknown_words', "SELECT * FROM word JOIN user_word_mastery ON user_word_mastery.word_id = word.word_id "
+                           "WHERE user_word_mastery.user_id = 1 AND user_word_mastery.is_mastered = 0"),
+    ('/api/word_image_generation', "SELECT word_id, picture FROM word WHERE word_en = 'x' ORDER BY word_id LIMIT 1"),
+    ('/api/user/learning_percent 词书总数', "SELECT word_count FROM word_catalog_version WHERE classification = 'CET4'"),
+    ('/api/user/first_word_friend', "SELECT * FROM user_profile JOIN user ON user.user_id = user_profile.user_id "
+                                    "WHERE user_profile.user_id = 1"),
+    ('/api/user/first_word_friend 词书进度', "SELECT * FROM user_classification_progress JOIN word_catalog_version "
+                                         "ON word_catalog_version.classification = user_classification_progress.classification "
+                                         "WHERE user_classification_progress.user_id = 1"),
+    ('/api/chat/conversations', "SELECT * FROM chat_messages WHERE user_id = 1 AND agent_id = 1 ORDER BY created_at"),
+    ('/api/chat 上下文', "SELECT message_id, content FROM chat_messages WHERE user_id = 1 AND agent_id = 1 "
+                       "AND (created_at, message_id) < ('2024-01-01 00:00:00', 1) "
+                       "ORDER BY created_at DESC, message_id DESC LIMIT 50"),
+    ('/api/latest_message_time', "SELECT * FROM chat_messages JOIN ai_agent ON chat_messages.agent_id = ai_agent.agent_id "
+                                 "WHERE chat_messages.user_id = 1 ORDER BY chat_messages.created_at DESC LIMIT 1"),
+    ('/api/transaction/create', "SELECT head_hash FROM ledger_head WHERE ledger_head_id = 1"),
+    ('/api/transactions/<wallet_key> 转出', "SELECT * FROM trade_transaction WHERE sender = 'x' "
+                                          "AND (created_at, trade_transaction_id) < ('2024-01-01 00:00:00', 1) "
+                                          "ORDER BY created_at DESC, trade_transaction_id DESC LIMIT 21"),
+    ('/api/transactions/<wallet_key> 转入', "SELECT * FROM trade_transaction WHERE receiver = 'x' "
+                                          "AND (created_at, trade_transaction_id) < ('2024-01-01 00:00:00', 1) "
+                                          "ORDER BY created_at DESC, trade_transaction_id DESC LIMIT 21"),
+    ('/api/transaction/<id>/proof', "SELECT * FROM ledger_checkpoint WHERE end_tx_id >= 1 ORDER BY end_tx_id LIMIT 1"),
+    ('/api/collect_story', "SELECT * FROM story_collection WHERE title = 'x' AND user_id = 1"),
+    ('/api/model/list', "SELECT name FROM word_friend WHERE user_id = 1"),
+    ('/api/achievements', "SELECT * FROM user_achievement WHERE user_id = 1"),
+]
+
+
+def full_scans(conn, sql):
+    """返回执行计划中不经过索引的全表扫描"""
+    plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+    return [row[3] for row in plan if row[3].startswith('SCAN ') and ' INDEX' not in row[3]]
+
+
+def check_query_plans(engine):
+    failures = []
+    with engine.connect() as conn:
+        for endpoint, sql in QUERY_PLAN_CHECKS:
+            scans = full_scans(conn, sql)
+            print(f"{'FAIL' if scans else 'OK  '} {endpoint} {'; '.join(scans)}")
+            if scans:
+                failures.append(endpoint)
+    return failures
+
+
+if __name__ == '__main__':
+    engine = create_engine(f'sqlite:///{sys.argv[1]}' if len(sys.argv) > 1 else 'sqlite://')
+    run_migrations(engine)
+    sys.exit(1 if check_query_plans(engine) else 0)
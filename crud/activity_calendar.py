@@ -0,0 +1,125 @@
+# 用户学习日历
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from sql_alchemy import db, User, UserActivityCalendar, UserWordMastery, UserDailyCount
+from utils.ActivityCalendar import ActivityCalendar
+
+
+def _to_date(value):
+    # 如果数据库返回的是字符串
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    # 如果数据库返回的是datetime对象
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _calendar_values(calendar):
+    return {
+        'start_date': calendar.start,
+        'bits': calendar.to_bytes(),
+        'learning_days': calendar.learning_days(),
+        'current_streak': calendar.current_streak(),
+        'longest_streak': calendar.longest_streak(),
+        'last_date': calendar.last_date(),
+    }
+
+
+def build_calendar(user_id):
+    """从历史掌握记录生成日历，只在日历不存在时调用一次"""
+    date_records = db.session.query(
+        db.func.DATE(UserWordMastery.created_at)
+    ).filter(
+        UserWordMastery.user_id == user_id
+    ).distinct().all()
+
+    dates = [_to_date(record[0]) for record in date_records if record[0]]
+    # 并发的首次请求可能同时生成日历，已存在时保留先写入的一份
+    db.session.execute(insert(UserActivityCalendar).values(
+        user_id=user_id, **_calendar_values(ActivityCalendar.from_dates(dates))
+    ).on_conflict_do_nothing(index_elements=[UserActivityCalendar.user_id]))
+    return db.session.get(UserActivityCalendar, user_id)
+
+
+def build_missing_calendars(lo, hi):
+    """
+    为 user_id 在 [lo, hi] 内还没有日历的用户批量生成日历
+    一条查询取出这些用户的全部学习日期(没有记录的用户日期为 NULL)，按用户分组后一条语句批量插入
+    返回生成的日历数
+    """
+    rows = db.session.execute(
+        select(User.user_id, db.func.DATE(UserWordMastery.created_at))
+        .outerjoin(UserActivityCalendar, UserActivityCalendar.user_id == User.user_id)
+        .outerjoin(UserWordMastery, UserWordMastery.user_id == User.user_id)
+        .where(User.user_id.between(lo, hi), UserActivityCalendar.user_id.is_(None))
+        .distinct()
+    ).all()
+    dates_by_user = {}
+    for user_id, day in rows:
+        dates = dates_by_user.setdefault(user_id, [])
+        if day:
+            dates.append(_to_date(day))
+    if not dates_by_user:
+        return 0
+
+    db.session.execute(insert(UserActivityCalendar).values([
+        {'user_id': user_id, **_calendar_values(ActivityCalendar.from_dates(dates))}
+        for user_id, dates in dates_by_user.items()
+    ]).on_conflict_do_nothing(index_elements=[UserActivityCalendar.user_id]))
+    return len(dates_by_user)
+
+
+def get_or_build_calendar(user_id):
+    return UserActivityCalendar.query.get(user_id) or build_calendar(user_id)
+
+
+def record_activity(user_id, day, retries=3):
+    """
+    记录某天有学习，返回 (这一天是否是新的学习日, 更新后的日历)
+    必须在新的掌握记录 add 到 session 之前调用，由调用方负责 commit
+    """
+    get_or_build_calendar(user_id)
+    for _ in range(retries):
+        start_date, bits = db.session.execute(
+            select(UserActivityCalendar.start_date, UserActivityCalendar.bits)
+            .where(UserActivityCalendar.user_id == user_id)
+        ).one()
+        calendar = ActivityCalendar(start_date, bits)
+        if not calendar.mark(day):
+            return False, calendar
+        # 以旧位图为条件更新(乐观锁)，并发写入时重新读取后重试
+        result = db.session.execute(
+            update(UserActivityCalendar)
+            .where(UserActivityCalendar.user_id == user_id, UserActivityCalendar.bits == bits)
+            .values(**_calendar_values(calendar))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return True, calendar
+    raise Exception('学习日历更新冲突，请重试')
+
+
+def record_daily_count(user_id, day, count=1):
+    """当天掌握记录数累加 count，返回累加后的数量"""
+    statement = insert(UserDailyCount).values(user_id=user_id, learning_date=day, word_count=count)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserDailyCount.user_id, UserDailyCount.learning_date],
+        set_={'word_count': UserDailyCount.word_count + count}
+    ).returning(UserDailyCount.word_count)
+    return db.session.execute(statement).scalar_one()
+
+
+def prune_daily_counts(before):
+    """删除 learning_date 早于 before 的每日计数，返回删除的行数，由调用方负责 commit"""
+    return db.session.execute(
+        delete(UserDailyCount).where(UserDailyCount.learning_date < before)
+    ).rowcount
+
+
+def get_streak(user_id):
+    return get_or_build_calendar(user_id).current_streak
+
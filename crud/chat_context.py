@@ -0,0 +1,151 @@
+# 对话上下文: 服务端按 token 预算从历史消息组装发给大模型的 messages
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.sqlite import insert
+
+from sql_alchemy import db, AIAgent, ChatMessage, ChatSummary
+from utils.AIClient import chat_completion
+
+ROLES = {'user': 'user', 'agent': 'assistant'}
+HISTORY_CHUNK = 50
+SUMMARY_MIN_MESSAGES = 20  # 窗口外积累到这么多条未摘要的消息才重新生成摘要
+SUMMARY_MAX_MESSAGES = 200  # 一次摘要最多读取的消息数
+
+_CJK = re.compile(r'[\u3000-\u9fff\uff00-\uffef]')
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数: 中文字符按 1 个，其余按 4 个字符 1 个"""
+    cjk = len(_CJK.findall(text or ''))
+    return cjk + (len(text or '') - cjk + 3) // 4
+
+
+def _message_tokens(row):
+    return row.tokens or estimate_tokens(row.content)
+
+
+def _history(user_id, agent_id, budget):
+    """从最新的消息往前取，直到用完 budget，返回 (按时间升序的消息, 窗口外最新一条消息的ID)"""
+    window, cursor = [], None
+    while budget > 0:
+        query = select(ChatMessage.message_id, ChatMessage.created_at, ChatMessage.sender_type,
+                       ChatMessage.content, ChatMessage.tokens) \
+            .where(ChatMessage.user_id == user_id, ChatMessage.agent_id == agent_id)
+        if cursor:
+            query = query.where(tuple_(ChatMessage.created_at, ChatMessage.message_id) < tuple_(*cursor))
+        rows = db.session.execute(
+            query.order_by(ChatMessage.created_at.desc(), ChatMessage.message_id.desc()).limit(HISTORY_CHUNK)
+        ).all()
+        for row in rows:
+            budget -= _message_tokens(row)
+            if budget < 0:
+                return window[::-1], row.message_id
+            window.append(row)
+        if len(rows) < HISTORY_CHUNK:
+            break
+        cursor = (rows[-1].created_at, rows[-1].message_id)
+    return window[::-1], None
+
+
+def build_context(user_id, agent_id, message, budget):
+    """
+    组装上下文: 智能体的 system_prompt + 早期对话摘要 + 预算内最近的历史 + 新消息
+    返回 (messages, 窗口外最新一条消息的ID)；智能体不存在时返回 (None, None)
+    """
+    system_prompt = db.session.execute(
+        select(AIAgent.system_prompt).where(AIAgent.agent_id == agent_id)
+    ).scalar()
+    if system_prompt is None:
+        return None, None
+
+    summary = db.session.get(ChatSummary, (user_id, agent_id))
+    budget -= estimate_tokens(system_prompt) + estimate_tokens(message) + (summary.tokens if summary else 0)
+    window, overflow_id = _history(user_id, agent_id, budget)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary and overflow_id:
+        messages.append({"role": "system", "content": f"之前的对话摘要: {summary.summary}"})
+    messages.extend({"role": ROLES.get(row.sender_type, 'user'), "content": row.content} for row in window)
+    messages.append({"role": "user", "content": message})
+    return messages, overflow_id
+
+
+def save_turn(user_id, agent_id, user_content, reply_content, user_created_at):
+    """用户消息和回复在一个事务中写入，返回两条消息的ID"""
+    user_message = ChatMessage(user_id=user_id, agent_id=agent_id, sender_type='user', content=user_content,
+                               tokens=estimate_tokens(user_content), created_at=user_created_at)
+    agent_message = ChatMessage(user_id=user_id, agent_id=agent_id, sender_type='agent', content=reply_content,
+                                tokens=estimate_tokens(reply_content), created_at=datetime.now())
+    db.session.add_all([user_message, agent_message])
+    db.session.commit()
+    return [user_message.message_id, agent_message.message_id]
+
+
+def _summarize(user_id, agent_id, overflow_id):
+    """
+    从上次摘要的位置按 message_id 升序往后读，每次最多 SUMMARY_MAX_MESSAGES 条并入摘要，
+    摘要只推进到实际读取的最后一条，积压较多时分几轮处理，不会跳过消息
+    """
+    while True:
+        summary = db.session.get(ChatSummary, (user_id, agent_id))
+        last_message_id = summary.last_message_id if summary else 0
+        rows = db.session.execute(
+            select(ChatMessage.message_id, ChatMessage.sender_type, ChatMessage.content)
+            .where(ChatMessage.user_id == user_id, ChatMessage.agent_id == agent_id,
+                   ChatMessage.message_id > last_message_id, ChatMessage.message_id <= overflow_id)
+            .order_by(ChatMessage.message_id)
+            .limit(SUMMARY_MAX_MESSAGES)
+        ).all()
+        if len(rows) < SUMMARY_MIN_MESSAGES:
+            return
+        previous = f"已有摘要: {summary.summary}\n" if summary else ''
+        db.session.rollback()  # 调用上游期间不占用数据库连接
+
+        transcript = '\n'.join(f"{'学生' if row.sender_type == 'user' else '老师'}: {row.content}" for row in rows)
+        text = chat_completion([
+            {"role": "system", "content": "请把英语老师和学生的对话总结成不超过200字的摘要，保留学生的学习情况、薄弱点和未完成的话题。"},
+            {"role": "user", "content": f"{previous}新的对话:\n{transcript}"}
+        ], timeout=30)['content']
+
+        statement = insert(ChatSummary).values(
+            user_id=user_id, agent_id=agent_id, summary=text, last_message_id=rows[-1].message_id,
+            tokens=estimate_tokens(text), updated_at=datetime.now()
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[ChatSummary.user_id, ChatSummary.agent_id],
+            set_={'summary': text, 'last_message_id': rows[-1].message_id, 'tokens': estimate_tokens(text),
+                  'updated_at': datetime.now()},
+            where=ChatSummary.last_message_id < statement.excluded.last_message_id  # 其他进程已推进得更远时不回退
+        ))
+        db.session.commit()
+        if len(rows) < SUMMARY_MAX_MESSAGES:
+            return
+
+
+def schedule_summary(app, user_id, agent_id, overflow_id):
+    """后台为窗口外的消息更新摘要，同一个会话同时只有一个摘要任务"""
+    key = (user_id, agent_id)
+    with _summarizing_lock:
+        if key in _summarizing:
+            return
+        _summarizing.add(key)
+
+    def run():
+        try:
+            with app.app_context():
+                _summarize(user_id, agent_id, overflow_id)
+        except Exception as e:
+            app.logger.warning(f"生成对话摘要失败: {e}")
+        finally:
+            with _summarizing_lock:
+                _summarizing.discard(key)
+
+    _summary_executor.submit(run)
@@ -1,5 +1,8 @@
 # 添加消息
 from datetime import datetime
+
+from sqlalchemy import select, tuple_
+
 from sql_alchemy import ChatMessage, db
 
 
@@ -26,6 +29,28 @@ def get_messages(user_id, agent_id, limit=None):
     return query.all()
 
 
+# 分页获取会话消息: 从最新的 limit 条开始，用 cursor 往前翻
+def get_message_page(user_id, agent_id, cursor=None, limit=50):
+    """
+    只查询展示需要的列，沿 (user_id, agent_id, created_at) 索引(隐含 message_id)倒序取 limit + 1 条
+    cursor 为上一页最早一条消息的 (created_at, message_id)
+    返回 (按时间升序的消息, 更早一页的游标)，没有更早的消息时游标为 None
+    """
+    query = select(ChatMessage.message_id, ChatMessage.sender_type, ChatMessage.content, ChatMessage.created_at) \
+        .where(ChatMessage.user_id == user_id, ChatMessage.agent_id == agent_id)
+    if cursor:
+        query = query.where(tuple_(ChatMessage.created_at, ChatMessage.message_id) < tuple_(*cursor))
+    rows = db.session.execute(
+        query.order_by(ChatMessage.created_at.desc(), ChatMessage.message_id.desc()).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].created_at, rows[-1].message_id)
+    return rows[::-1], next_cursor
+
+
 # 归档消息
 def archive_message(message_id):
     message = ChatMessage.query.get(message_id)
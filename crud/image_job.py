@@ -0,0 +1,186 @@
+# 图片生成任务队列
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, or_, and_
+
+from sql_alchemy import db, ImageJob
+from utils.UserUtil import generate_hex_id
+
+FINISHED_STATUSES = ('done', 'failed')
+
+
+def job_to_dict(job):
+    data = {
+        "job_id": job.image_job_id,
+        "kind": job.kind,
+        "status": job.status,
+    }
+    if job.status == 'done':
+        data["result"] = json.loads(job.result)
+    elif job.status == 'failed':
+        data["error"] = job.error
+    return data
+
+
+class JobQueue:
+    """
+    持久化在 SQLite 中的后台任务队列
+    提交时写入 pending 任务并交给本进程的线程池执行，线程池大小限制同时进行的上游调用数；
+    执行前以条件更新抢占任务并设置租约，多个 worker 进程不会重复执行同一个任务。
+    后台线程定期扫描: 没被执行的 pending 任务、租约过期的 running 任务(worker 重启时中断的)重新执行，
+    超过 retention 的已完成任务被清理
+    handlers: kind -> 函数(params) -> 可 JSON 序列化的结果，在应用上下文之外执行
+    """
+
+    def __init__(self, app, handlers, max_workers=4, lease=120, max_attempts=3, sweep_interval=10,
+                 retention=timedelta(days=1)):
+        self.app = app
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-job')
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition()
+        self._generation = 0  # 每结束一个任务加一，等待前后对比，避免错过通知
+        self._sweeper = None
+
+    def start(self):
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._sweeper = threading.Thread(target=self._sweep_forever, name='image-job-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def submit(self, kind, params):
+        """写入任务并排入线程池，返回任务ID；在请求的应用上下文中调用"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知的任务类型: {kind}")
+        job = ImageJob(image_job_id=generate_hex_id(), kind=kind, params=json.dumps(params, ensure_ascii=False))
+        db.session.add(job)
+        db.session.commit()
+        self._dispatch(job.image_job_id)
+        return job.image_job_id
+
+    def get(self, job_id):
+        return db.session.get(ImageJob, job_id)
+
+    def wait(self, job_id, timeout):
+        """等待任务结束或超时，返回任务；任务不存在返回 None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self._generation
+            db.session.expire_all()
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if not job or job.status in FINISHED_STATUSES or remaining <= 0:
+                return job
+            # 本进程执行的任务结束时会立即唤醒，其他进程执行的任务靠轮询发现
+            with self._finished:
+                if generation == self._generation:
+                    self._finished.wait(min(remaining, 0.5))
+
+    def _dispatch(self, job_id):
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            self._inflight.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _claim(self, job_id):
+        """抢占任务并设置租约，返回 (kind, params)；任务已被其他进程抢占时返回 None"""
+        now = datetime.now()
+        claimed = db.session.execute(
+            update(ImageJob)
+            .where(
+                ImageJob.image_job_id == job_id,
+                or_(ImageJob.status == 'pending', and_(ImageJob.status == 'running', ImageJob.locked_until < now))
+            )
+            .values(status='running', attempts=ImageJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.lease), updated_at=now)
+            .returning(ImageJob.kind, ImageJob.params)
+        ).first()
+        db.session.commit()
+        return claimed
+
+    def _finish(self, job_id, **values):
+        db.session.execute(
+            update(ImageJob)
+            .where(ImageJob.image_job_id == job_id, ImageJob.status == 'running')
+            .values(locked_until=None, updated_at=datetime.now(), **values)
+        )
+        db.session.commit()
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                claimed = self._claim(job_id)
+            if not claimed:
+                return
+
+            try:
+                result, error = self.handlers[claimed.kind](json.loads(claimed.params)), None
+            except Exception as e:
+                result, error = None, str(e) or e.__class__.__name__
+
+            with self.app.app_context():
+                if error is None:
+                    self._finish(job_id, status='done', result=json.dumps(result, ensure_ascii=False))
+                else:
+                    self.app.logger.warning(f"图片任务 {job_id} 失败: {error}")
+                    self._finish(job_id, status='failed', error=error)
+        except Exception as e:
+            self.app.logger.error(f"图片任务 {job_id} 执行异常: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(job_id)
+            with self._finished:
+                self._generation += 1
+                self._finished.notify_all()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception as e:
+                self.app.logger.error(f"扫描图片任务失败: {e}")
+
+    def sweep(self):
+        """重新执行遗留的任务并清理过期任务，返回排入线程池的任务数"""
+        now = datetime.now()
+        # 重试次数用尽的任务标记为失败
+        db.session.execute(
+            update(ImageJob)
+            .where(ImageJob.status == 'running', ImageJob.locked_until < now, ImageJob.attempts >= self.max_attempts)
+            .values(status='failed', error='任务多次执行超时', locked_until=None, updated_at=now)
+        )
+        db.session.execute(
+            delete(ImageJob).where(ImageJob.status.in_(FINISHED_STATUSES), ImageJob.updated_at < now - self.retention)
+        )
+        db.session.commit()
+
+        # 线程池空闲多少就捞多少，避免积压
+        with self._lock:
+            capacity = self.max_workers - len(self._inflight)
+        if capacity <= 0:
+            return 0
+        job_ids = db.session.execute(
+            select(ImageJob.image_job_id)
+            .where(or_(
+                ImageJob.status == 'pending',
+                and_(ImageJob.status == 'running', ImageJob.locked_until < now)
+            ))
+            .order_by(ImageJob.created_at)
+            .limit(capacity)
+        ).scalars().all()
+        for job_id in job_ids:
+            self._dispatch(job_id)
+        return len(job_ids)
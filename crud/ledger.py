@@ -0,0 +1,234 @@
+# 词力值账本: 转账交易的追加写入
+import hashlib
+import heapq
+import queue
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert
+
+from sql_alchemy import db, User, TradeTransaction, LedgerHead
+
+LEDGER_HEAD_ID = 1
+
+
+class LedgerError(Exception):
+    """转账校验失败，status_code 为返回给前端的状态码"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _load_head():
+    head_hash = db.session.execute(
+        select(LedgerHead.head_hash).where(LedgerHead.ledger_head_id == LEDGER_HEAD_ID)
+    ).scalar()
+    if head_hash is not None:
+        return head_hash
+
+    # 第一次使用账本: 以现有最后一笔交易作为链头
+    last_hash = db.session.execute(
+        select(TradeTransaction.current_hash).order_by(TradeTransaction.trade_transaction_id.desc()).limit(1)
+    ).scalar()
+    db.session.execute(
+        insert(LedgerHead)
+        .values(ledger_head_id=LEDGER_HEAD_ID, head_hash=last_hash or "0", tx_count=0, updated_at=datetime.now())
+        .on_conflict_do_nothing()
+    )
+    return db.session.execute(
+        select(LedgerHead.head_hash).where(LedgerHead.ledger_head_id == LEDGER_HEAD_ID)
+    ).scalar()
+
+
+def _apply_transfer(sender, receiver, amount, previous_hash):
+    """在当前事务中写入一笔转账，返回回执；校验失败时抛出 LedgerError 且不产生任何写入"""
+    # 检查接收者是否存在
+    if not db.session.execute(select(User.user_id).where(User.wallet_key == receiver)).scalar():
+        raise LedgerError("Receiver not found", 404)
+
+    # 扣减发送者余额，余额不足时不更新任何行
+    sender_balance = db.session.execute(
+        update(User)
+        .where(User.wallet_key == sender, User.word_power_amount >= amount)
+        .values(word_power_amount=User.word_power_amount - amount)
+        .returning(User.word_power_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if sender_balance is None:
+        if not db.session.execute(select(User.user_id).where(User.wallet_key == sender)).scalar():
+            raise LedgerError("Sender not found", 404)
+        raise LedgerError("Insufficient word power", 400)
+
+    receiver_balance = db.session.execute(
+        update(User)
+        .where(User.wallet_key == receiver)
+        .values(word_power_amount=User.word_power_amount + amount)
+        .returning(User.word_power_amount)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+    # 创建交易数据，hash 只由交易本身的字段和上一笔的 hash 计算
+    current_time = datetime.now()
+    tx_data = f"{sender}{receiver}{amount}{current_time}{previous_hash}"
+    current_hash = hashlib.sha256(tx_data.encode()).hexdigest()
+
+    transaction = TradeTransaction(
+        sender=sender,
+        receiver=receiver,
+        amount=amount,
+        created_at=current_time,
+        previous_hash=previous_hash,
+        current_hash=current_hash,
+        sender_balance=sender_balance,
+        receiver_balance=receiver_balance
+    )
+    db.session.add(transaction)
+    db.session.flush()  # 取得 trade_transaction_id，回执中的交易ID可用于查询 Merkle 证明
+    return transaction, {"transaction_id": transaction.trade_transaction_id, "hash": current_hash}
+
+
+class _HeadMoved(Exception):
+    """链头已被其他进程推进"""
+
+
+class LedgerWriter:
+    """
+    账本的单写者
+    转账请求进入队列，由后台线程成批处理: 一批转账共用一个事务、一次提交(group commit)。
+    链头 hash 保存在 ledger_head 表中，提交前以旧链头为条件更新，
+    其他 worker 进程抢先追加时整批回滚重试，保证链不分叉
+    """
+
+    def __init__(self, app, max_batch=64, max_wait=0.005, retries=5):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.retries = retries
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, sender, receiver, amount):
+        """提交转账，返回 Future，结果为回执 {"transaction_id", "hash"}"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((sender, receiver, amount, future))
+        return future
+
+    def transfer(self, sender, receiver, amount):
+        """
+        提交转账并等待结果
+        不设超时: 转账进入队列后一定会被提交或失败，超时返回会让已经转出的转账被客户端当成失败
+        """
+        return self.submit(sender, receiver, amount).result()
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='ledger-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 攒一小批再提交，多个转账共用一次 fsync
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            with self.app.app_context():
+                self._process(batch)
+
+    def _process(self, batch):
+        for _ in range(self.retries):
+            try:
+                results = self._append(batch)
+                db.session.commit()
+                break
+            except (_HeadMoved, OperationalError):
+                # 链头被其他进程推进，或等待写锁超时(busy_timeout)，整批回滚重试
+                db.session.rollback()
+            except Exception as e:
+                db.session.rollback()
+                results = [e] * len(batch)
+                break
+        else:
+            results = [Exception("账本写入冲突，请重试")] * len(batch)
+
+        for (_, _, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        db.session.remove()
+
+    def _append(self, batch):
+        # 一开始就取得写锁: 延迟事务先读链头、后写入时，其他进程在中间提交会让写入直接失败(SQLITE_BUSY_SNAPSHOT)，
+        # 取得写锁后链头在事务内不会再变化
+        db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+        old_head = head = _load_head()
+        results, appended = [], 0
+        for sender, receiver, amount, _ in batch:
+            try:
+                _, receipt = _apply_transfer(sender, receiver, amount, head)
+            except LedgerError as e:
+                results.append(e)
+                continue
+            head = receipt["hash"]
+            appended += 1
+            results.append(receipt)
+
+        if appended:
+            moved = db.session.execute(
+                update(LedgerHead)
+                .where(LedgerHead.ledger_head_id == LEDGER_HEAD_ID, LedgerHead.head_hash == old_head)
+                .values(head_hash=head, tx_count=LedgerHead.tx_count + appended, updated_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not moved:
+                raise _HeadMoved()
+        return results
+
+
+def _wallet_side(column, wallet_key, cursor, limit):
+    query = select(TradeTransaction).where(column == wallet_key)
+    if cursor:
+        query = query.where(
+            tuple_(TradeTransaction.created_at, TradeTransaction.trade_transaction_id) < tuple_(*cursor)
+        )
+    return db.session.execute(
+        query.order_by(TradeTransaction.created_at.desc(), TradeTransaction.trade_transaction_id.desc()).limit(limit)
+    ).scalars().all()
+
+
+def get_wallet_transactions(wallet_key, cursor=None, limit=20):
+    """
+    按时间倒序取钱包的一页交易记录
+    转出、转入分别沿 (sender/receiver, created_at, trade_transaction_id) 索引取 limit + 1 条再按顺序归并，
+    不管历史多长，每页都只读 2 * (limit + 1) 行
+    cursor 为上一页最后一笔交易的 (created_at, trade_transaction_id)，返回 (交易列表, 下一页游标)
+    """
+    sides = [
+        _wallet_side(TradeTransaction.sender, wallet_key, cursor, limit + 1),
+        _wallet_side(TradeTransaction.receiver, wallet_key, cursor, limit + 1),
+    ]
+    transactions, seen = [], set()
+    for tx in heapq.merge(*sides, key=lambda tx: (tx.created_at, tx.trade_transaction_id), reverse=True):
+        if tx.trade_transaction_id in seen:  # 转给自己的交易在两边各出现一次
+            continue
+        seen.add(tx.trade_transaction_id)
+        transactions.append(tx)
+        if len(transactions) > limit:
+            break
+
+    if len(transactions) <= limit:
+        return transactions, None
+    transactions = transactions[:limit]
+    return transactions, (transactions[-1].created_at, transactions[-1].trade_transaction_id)
@@ -0,0 +1,179 @@
+# 词力值账本检查点与 Merkle 证明
+import bisect
+import hashlib
+import hmac
+import os
+
+from sqlalchemy import select
+
+from sqlalchemy.dialects.sqlite import insert
+
+from sql_alchemy import db, TradeTransaction, LedgerCheckpoint
+from utils.CacheUtil import TTLCache, SingleFlight
+from utils.Merkle import transaction_leaf, MerkleTree
+
+CHECKPOINT_BLOCK_SIZE = 1024
+
+# 检查点区块的 Merkle 树，区块生成后不再变化；一个 1024 笔的区块约占 450KB
+_block_trees = TTLCache(ttl=3600, max_entries=16)
+_block_flight = SingleFlight()
+
+# 计算叶子和校验链接所需的列
+TRANSACTION_COLUMNS = (
+    TradeTransaction.trade_transaction_id, TradeTransaction.sender, TradeTransaction.receiver,
+    TradeTransaction.amount, TradeTransaction.created_at, TradeTransaction.previous_hash, TradeTransaction.current_hash,
+)
+
+
+def checkpoint_secret():
+    """检查点签名密钥，必须通过环境变量配置；没有密钥时不签名也不校验"""
+    secret = os.getenv('LEDGER_CHECKPOINT_SECRET')
+    if not secret:
+        raise RuntimeError("未设置 LEDGER_CHECKPOINT_SECRET，不能签名或校验账本检查点")
+    return secret
+
+
+def sign_checkpoint(start_tx_id, end_tx_id, start_previous_hash, end_hash, root, secret=None):
+    secret = secret or checkpoint_secret()
+    message = f"{start_tx_id}|{end_tx_id}|{start_previous_hash}|{end_hash}|{root}"
+    return hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def chain_breaks(rows, previous_hash=None):
+    """检查相邻交易的 hash 链接，返回断开处的交易ID列表；previous_hash 为上一段最后一笔交易的 hash"""
+    breaks = []
+    for row in rows:
+        if previous_hash is not None and row.previous_hash != previous_hash:
+            breaks.append(row.trade_transaction_id)
+        previous_hash = row.current_hash
+    return breaks
+
+
+def transactions_after(session, after_tx_id, limit):
+    return session.execute(
+        select(*TRANSACTION_COLUMNS)
+        .where(TradeTransaction.trade_transaction_id > after_tx_id)
+        .order_by(TradeTransaction.trade_transaction_id)
+        .limit(limit)
+    ).all()
+
+
+def build_checkpoints(block_size=CHECKPOINT_BLOCK_SIZE, logger=None):
+    """
+    为尚未覆盖的交易生成检查点，只对凑满 block_size 笔的区块生成，返回新增的检查点数
+    链在某处断开时停止生成，不为损坏的链签名
+    多个 worker 同时生成同一个区块时，先写入的检查点保留，其余的忽略
+    """
+    secret = checkpoint_secret()
+    last = db.session.execute(
+        select(LedgerCheckpoint).order_by(LedgerCheckpoint.end_tx_id.desc()).limit(1)
+    ).scalar()
+    after_tx_id, previous_hash = (last.end_tx_id, last.end_hash) if last else (0, None)
+
+    created = 0
+    while True:
+        rows = transactions_after(db.session, after_tx_id, block_size)
+        if len(rows) < block_size:
+            break
+        breaks = chain_breaks(rows, previous_hash)
+        if breaks:
+            if logger:
+                logger.error(f"账本 hash 链在交易 {breaks[0]} 处断开，停止生成检查点")
+            break
+
+        root = MerkleTree([transaction_leaf(row) for row in rows]).root
+        start, end = rows[0], rows[-1]
+        result = db.session.execute(insert(LedgerCheckpoint).values(
+            start_tx_id=start.trade_transaction_id,
+            end_tx_id=end.trade_transaction_id,
+            tx_count=len(rows),
+            start_previous_hash=start.previous_hash,
+            end_hash=end.current_hash,
+            merkle_root=root,
+            signature=sign_checkpoint(start.trade_transaction_id, end.trade_transaction_id,
+                                      start.previous_hash, end.current_hash, root, secret)
+        ).on_conflict_do_nothing(index_elements=[LedgerCheckpoint.end_tx_id]))
+        db.session.commit()
+        created += result.rowcount
+        after_tx_id, previous_hash = end.trade_transaction_id, end.current_hash
+    return created
+
+
+def ledger_checkpoint_job(app, block_size=CHECKPOINT_BLOCK_SIZE):
+    """定时任务: 生成账本检查点"""
+    with app.app_context():
+        try:
+            created = build_checkpoints(block_size, app.logger)
+            if created:
+                app.logger.info(f"生成账本检查点 {created} 个")
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"生成账本检查点失败: {e}")
+        finally:
+            db.session.remove()
+
+
+def _load_block_tree(checkpoint):
+    """读取检查点区块的交易，返回 (交易ID列表, Merkle 树)"""
+    block = db.session.execute(
+        select(*TRANSACTION_COLUMNS)
+        .where(TradeTransaction.trade_transaction_id.between(checkpoint.start_tx_id, checkpoint.end_tx_id))
+        .order_by(TradeTransaction.trade_transaction_id)
+    ).all()
+    tree = MerkleTree([transaction_leaf(row) for row in block])
+    if tree.root != checkpoint.merkle_root:
+        raise Exception("区块交易与检查点不一致")
+    return [row.trade_transaction_id for row in block], tree
+
+
+def get_transaction_proof(trade_transaction_id):
+    """
+    返回交易在所属检查点区块中的 Merkle 证明，交易不存在返回 None，
+    交易所在区块还没有生成检查点时 proof 为 None
+    """
+    tx = db.session.execute(
+        select(*TRANSACTION_COLUMNS).where(TradeTransaction.trade_transaction_id == trade_transaction_id)
+    ).first()
+    if not tx:
+        return None
+
+    transaction = {
+        "id": tx.trade_transaction_id,
+        "sender": tx.sender,
+        "receiver": tx.receiver,
+        "amount": tx.amount,
+        "created_at": tx.created_at.isoformat() if tx.created_at else None,
+        "previous_hash": tx.previous_hash,
+        "current_hash": tx.current_hash,
+    }
+    leaf = transaction_leaf(tx)
+
+    checkpoint = db.session.execute(
+        select(LedgerCheckpoint)
+        .where(LedgerCheckpoint.end_tx_id >= trade_transaction_id)
+        .order_by(LedgerCheckpoint.end_tx_id)
+        .limit(1)
+    ).scalar()
+    if not checkpoint or checkpoint.start_tx_id > trade_transaction_id:
+        return {"transaction": transaction, "leaf": leaf, "proof": None, "checkpoint": None}
+
+    # 区块的 Merkle 树按检查点缓存，同一区块的证明只读取、计算一次
+    tx_ids, tree = _block_trees.get_or_create(
+        checkpoint.ledger_checkpoint_id, lambda: _load_block_tree(checkpoint), _block_flight
+    )
+    index = bisect.bisect_left(tx_ids, trade_transaction_id)
+
+    return {
+        "transaction": transaction,
+        "leaf": leaf,
+        "proof": tree.proof(index),
+        "checkpoint": {
+            "id": checkpoint.ledger_checkpoint_id,
+            "start_tx_id": checkpoint.start_tx_id,
+            "end_tx_id": checkpoint.end_tx_id,
+            "start_previous_hash": checkpoint.start_previous_hash,
+            "end_hash": checkpoint.end_hash,
+            "merkle_root": checkpoint.merkle_root,
+            "signature": checkpoint.signature,
+        },
+    }
@@ -0,0 +1,44 @@
+# 会话: 令牌对应的用户身份
+from sqlalchemy import select, update
+
+from sql_alchemy import db, User
+from utils.CacheUtil import TTLCache
+
+# 恢复登录时返回的用户信息(词力值变化频繁，不缓存)
+IDENTITY_COLUMNS = (User.user_id, User.wechat_openid, User.username, User.email, User.avatar_url, User.wallet_key,
+                    User.preferred_classification, User.preferred_plan_daily)
+
+# user_id -> 用户身份，只缓存有效用户；本进程修改用户信息时调用 forget_identity，其他 worker 最多延迟 ttl 秒
+_identities = TTLCache(ttl=60, max_entries=10000)
+
+
+def get_active_identity(user_id):
+    """返回未删除用户的身份(按列名取值的行)，用户不存在或已删除时返回 None"""
+    identity = _identities.get(user_id)
+    if identity is None:
+        identity = db.session.execute(
+            select(*IDENTITY_COLUMNS).where(User.user_id == user_id, User.is_deleted == 0)
+        ).first()
+        if identity is not None:
+            _identities.set(user_id, identity)
+    return identity
+
+
+def forget_identity(user_id):
+    _identities.delete(user_id)
+
+
+def rotate_session_generation(user_id, generation=None):
+    """
+    会话代数加一并返回新的代数，refresh 令牌记录签发时的代数
+    传入 generation 时只有代数一致才更新，同一个 refresh 令牌只能使用一次；用户不存在、已删除或代数不一致时返回 None
+    由调用方负责 commit
+    """
+    statement = update(User).where(User.user_id == user_id, User.is_deleted == 0)
+    if generation is not None:
+        statement = statement.where(User.session_generation == generation)
+    return db.session.execute(
+        statement.values(session_generation=User.session_generation + 1)
+        .returning(User.session_generation)
+        .execution_options(synchronize_session=False)
+    ).scalar()
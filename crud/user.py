@@ -1,7 +1,11 @@
 # 创建用户
+import json
+
 from faker import Faker
 
-from sql_alchemy import User, db, WordFriend, WordFriendLevelConfig, UserWordMastery, UserAchievement, Word
+from crud.user_profile import build_profile
+from crud.word_progress import get_progress, list_progress
+from sql_alchemy import User, db, WordFriend, UserAchievement, UserProfile
 from utils.UserUtil import generate_hex_id
 
 
@@ -48,39 +52,32 @@ def delete_user(user_id):
     return False
 
 def get_user_info(user_id):
-    # 查询用户关联的第一个单词伙伴（按关联ID排序）
-    word_friend = WordFriend.query.filter_by(user_id=user_id).first()
-    if not word_friend: # 该用户暂无单词伙伴
-        return None
+    # 从资料快照读取，快照随掌握记录/词友的写入增量更新
+    row = db.session.query(UserProfile, User.word_power_amount) \
+        .join(User, User.user_id == UserProfile.user_id) \
+        .filter(UserProfile.user_id == user_id) \
+        .first()
+    if row:
+        profile, word_power_amount = row
+    else:
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        profile = build_profile(user_id)
+        db.session.commit()
+        word_power_amount = user.word_power_amount
 
-    next_level_config = WordFriendLevelConfig.query.filter_by(exp_level=word_friend.level + 1).first()
-    mastery_word_count = db.session.query(UserWordMastery.word_id) \
-        .filter(UserWordMastery.user_id == user_id) \
-        .distinct() \
-        .count()
-    # 查询用户有学习记录的不同日期数
-    learning_days = db.session.query(
-        db.func.DATE(UserWordMastery.created_at)
-    ).filter(
-        UserWordMastery.user_id == user_id
-    ).group_by(
-        db.func.DATE(UserWordMastery.created_at)
-    ).count()
+    if not profile.word_friend: # 该用户暂无单词伙伴
+        return None
 
     return {
-        'word_friend': {
-            'id': word_friend.word_friend_id,
-            'name': word_friend.name,
-            'level': word_friend.level,
-            'exp': word_friend.exp,
-            "next_level_require": next_level_config.exp_require,
-            'nickname': word_friend.nickname
-        },
+        'word_friend': json.loads(profile.word_friend),
         'user_info': {
-            "learning_days": learning_days,
-            "mastery_word_count": mastery_word_count,
-            "word_power_amount": word_friend.user.word_power_amount,
-        }
+            "learning_days": profile.learning_days,
+            "mastery_word_count": profile.mastery_word_count,
+            "word_power_amount": word_power_amount,
+        },
+        'progress': list_progress(user_id)  # 各词书的学习进度
     }
 
 def init_user(openid, session_key):
@@ -134,5 +131,5 @@ def init_user(openid, session_key):
 
 
 def get_learning_percent(user_id, word_type):
-    result = round(UserWordMastery.query.filter_by(user_id=user_id, word_type=word_type).count() / Word.query.filter_by(classification=word_type).count() * 100)
-    return result
\ No newline at end of file
+    # 学过的单词(含生词本)占词书的百分比，读取计数器，不再扫描掌握记录和词书
+    return get_progress(user_id, word_type)['percent']
\ No newline at end of file
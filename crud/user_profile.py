@@ -0,0 +1,105 @@
+# 用户资料快照
+import json
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+
+from crud.activity_calendar import get_or_build_calendar, record_activity, record_daily_count
+from sql_alchemy import db, UserProfile, UserWordMastery, WordFriend, WordFriendLevelConfig
+
+
+def _word_friend_snapshot(user_id):
+    # 查询用户关联的第一个单词伙伴（按关联ID排序）
+    word_friend = WordFriend.query.filter_by(user_id=user_id).first()
+    if not word_friend: # 该用户暂无单词伙伴
+        return None
+
+    next_level_config = WordFriendLevelConfig.query.filter_by(exp_level=word_friend.level + 1).first()
+    return json.dumps({
+        'id': word_friend.word_friend_id,
+        'name': word_friend.name,
+        'level': word_friend.level,
+        'exp': word_friend.exp,
+        "next_level_require": next_level_config.exp_require if next_level_config else None,
+        'nickname': word_friend.nickname
+    }, ensure_ascii=False)
+
+
+def build_profile(user_id):
+    """全量扫描一次生成快照，只在快照不存在时调用"""
+    mastery_word_count = db.session.query(UserWordMastery.word_id) \
+        .filter(UserWordMastery.user_id == user_id) \
+        .distinct() \
+        .count()
+    # 学习天数来自学习日历，不再按日期分组扫描
+    calendar = get_or_build_calendar(user_id)
+
+    # 并发的首次请求可能同时生成快照，已存在时保留先写入的一份
+    db.session.execute(insert(UserProfile).values(
+        user_id=user_id,
+        mastery_word_count=mastery_word_count,
+        learning_days=calendar.learning_days,
+        last_learning_date=calendar.last_date,
+        word_friend=_word_friend_snapshot(user_id)
+    ).on_conflict_do_nothing(index_elements=[UserProfile.user_id]))
+    return db.session.get(UserProfile, user_id)
+
+
+def get_or_build_profile(user_id):
+    return UserProfile.query.get(user_id) or build_profile(user_id)
+
+
+def record_mastery(user_id, word_id, created_at):
+    """
+    新增一条掌握记录时更新快照和学习日历，必须在新记录 add 到 session 之前调用，
+    由调用方负责 commit
+    返回成就判断所需的计数器: total(学过的单词数), daily(当天记录数), streak(连续学习天数)
+    """
+    get_or_build_profile(user_id)
+    is_new_word = not db.session.query(
+        UserWordMastery.query.filter_by(user_id=user_id, word_id=word_id).exists()
+    ).scalar()
+    return record_mastery_batch(user_id, created_at, 1 if is_new_word else 0, 1)
+
+
+def record_mastery_batch(user_id, created_at, new_word_count, new_record_count):
+    """
+    同一天新增多条掌握记录时更新快照和学习日历，由调用方负责 commit
+    new_word_count: 之前没有任何记录的单词数; new_record_count: 新增的记录数
+    """
+    get_or_build_profile(user_id)
+
+    # 用 SQL 表达式原地自增，多个 worker 并发写入时不会丢失更新
+    mastery_word_count = db.session.execute(
+        update(UserProfile)
+        .where(UserProfile.user_id == user_id)
+        .values(mastery_word_count=UserProfile.mastery_word_count + new_word_count)
+        .returning(UserProfile.mastery_word_count)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+    learning_date = created_at.date()
+    is_new_day, calendar = record_activity(user_id, learning_date)
+    if is_new_day:
+        UserProfile.query.filter_by(user_id=user_id).update(
+            {UserProfile.learning_days: UserProfile.learning_days + 1},
+            synchronize_session=False
+        )
+        UserProfile.query.filter(
+            UserProfile.user_id == user_id,
+            db.or_(UserProfile.last_learning_date.is_(None), UserProfile.last_learning_date < learning_date)
+        ).update({UserProfile.last_learning_date: learning_date}, synchronize_session=False)
+
+    return {
+        'total': mastery_word_count,
+        'daily': record_daily_count(user_id, learning_date, new_record_count),
+        'streak': calendar.current_streak(),
+    }
+
+
+def refresh_word_friend(user_id):
+    """词友信息变化后刷新快照，由调用方负责 commit"""
+    UserProfile.query.filter_by(user_id=user_id).update(
+        {UserProfile.word_friend: _word_friend_snapshot(user_id)},
+        synchronize_session=False
+    )
@@ -0,0 +1,65 @@
+# 批量标记单词掌握状态
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from crud.user_profile import record_mastery_batch
+from crud.word_progress import mastery_counts, update_progress_counts
+from sql_alchemy import db, UserWordMastery
+
+
+def mark_words(user_id, items):
+    """
+    批量写入掌握记录: 一条 upsert 语句、一个事务
+    items: [{"word_id": 1, "word_type": "CET4", "is_mastered": 1}, ...]，同一单词出现多次时以最后一次为准
+    返回 (新增记录数, 状态变化的记录数, 成就计数器)
+    """
+    marks = {}
+    for item in items:
+        marks[(int(item['word_id']), item['word_type'])] = int(item.get('is_mastered', 1))
+
+    # 一次查出这批单词已有的记录，用来区分新增和更新
+    existing = db.session.execute(
+        select(UserWordMastery.word_id, UserWordMastery.word_type, UserWordMastery.is_mastered).where(
+            UserWordMastery.user_id == user_id,
+            UserWordMastery.word_id.in_({word_id for word_id, _ in marks})
+        )
+    ).all()
+    existing_marks = {(row.word_id, row.word_type): row.is_mastered for row in existing}
+    seen_word_ids = {row.word_id for row in existing}
+
+    new_keys = [key for key in marks if key not in existing_marks]
+    changed_count = sum(1 for key, is_mastered in marks.items() if key in existing_marks and existing_marks[key] != is_mastered)
+    new_word_count = len({word_id for word_id, _ in new_keys} - seen_word_ids)
+
+    # 词书进度计数: 新记录加上自身的贡献，状态变化的记录减去旧状态的贡献
+    deltas = {}
+    for (word_id, word_type), is_mastered in marks.items():
+        mastered, unknown = mastery_counts(is_mastered)
+        if (word_id, word_type) in existing_marks:
+            old_mastered, old_unknown = mastery_counts(existing_marks[(word_id, word_type)])
+            mastered, unknown = mastered - old_mastered, unknown - old_unknown
+        total_mastered, total_unknown = deltas.get(word_type, (0, 0))
+        deltas[word_type] = (total_mastered + mastered, total_unknown + unknown)
+
+    now = datetime.now()
+    counters = None
+    if new_keys:
+        counters = record_mastery_batch(user_id, now, new_word_count, len(new_keys))
+
+    statement = insert(UserWordMastery).values([{
+        'user_id': user_id,
+        'word_id': word_id,
+        'word_type': word_type,
+        'created_at': now,
+        'is_mastered': is_mastered
+    } for (word_id, word_type), is_mastered in marks.items()])
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserWordMastery.user_id, UserWordMastery.word_id, UserWordMastery.word_type],
+        set_={'is_mastered': statement.excluded.is_mastered}
+    )
+    db.session.execute(statement)
+    update_progress_counts(user_id, deltas)
+    db.session.commit()
+    return len(new_keys), changed_count, counters
@@ -0,0 +1,123 @@
+# 单词插图: 生成一次后下载到本地，记录在 Word.picture
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update
+
+from sql_alchemy import db, Word
+from utils.AIClient import http_session, generate_word_image
+from utils.CacheUtil import SingleFlight
+
+WORD_PICTURE_FOLDER = 'static/word_picture'
+MAX_PICTURE_BYTES = 10 * 1024 * 1024
+PICTURE_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp', 'image/gif': '.gif'}
+# 生成(15 秒) + 下载(10 秒) 要在插图接口的最长同步等待时间(30 秒)内完成
+GENERATE_TIMEOUT = 15
+DOWNLOAD_TIMEOUT = 10
+
+_flight = SingleFlight()
+
+
+def _image_url(data):
+    # 工作流输出可能是 URL 字符串、URL 列表或带 url 字段的对象
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if isinstance(data, dict):
+        data = data.get('url')
+    if not isinstance(data, str) or not data.startswith('http'):
+        raise Exception('AI图像生成接口返回的图片地址不正确')
+    return data
+
+
+def download_picture(url, word_id, timeout=DOWNLOAD_TIMEOUT):
+    """下载图片到 WORD_PICTURE_FOLDER，文件名带内容 hash，返回相对路径"""
+    os.makedirs(WORD_PICTURE_FOLDER, exist_ok=True)
+    with http_session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(f"下载单词插图失败，状态码: {response.status_code}")
+        extension = PICTURE_EXTENSIONS.get(response.headers.get('Content-Type', '').split(';')[0].strip(), '.png')
+
+        digest, size = hashlib.sha256(), 0
+        fd, tmp_path = tempfile.mkstemp(dir=WORD_PICTURE_FOLDER, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > MAX_PICTURE_BYTES:
+                        raise Exception('单词插图过大')
+                    digest.update(chunk)
+                    f.write(chunk)
+            path = f"{WORD_PICTURE_FOLDER}/{word_id}_{digest.hexdigest()[:16]}{extension}"
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    return path
+
+
+def cached_picture(picture):
+    """Word.picture 指向的本地文件存在时返回路径，否则返回 None"""
+    if picture and picture.startswith(WORD_PICTURE_FOLDER + '/') and os.path.exists(picture):
+        return picture
+    return None
+
+
+def illustrate_word(word_id):
+    """
+    返回单词插图的本地路径，没有时调用工作流生成、下载并写入 Word.picture，在应用上下文中调用
+    同一进程内同一个单词的并发请求只生成一次；写入会触发词书版本号更新，词库缓存随之刷新
+    """
+    row = db.session.execute(select(Word.word_en, Word.picture).where(Word.word_id == word_id)).first()
+    if not row:
+        raise Exception('单词不存在')
+    if cached_picture(row.picture):
+        return row.picture
+    db.session.rollback()  # 调用上游期间不占用数据库连接
+
+    def generate():
+        path = download_picture(_image_url(generate_word_image(row.word_en, GENERATE_TIMEOUT)), word_id)
+        # 其他进程已经写入时保留先写入的那张
+        updated = db.session.execute(
+            update(Word)
+            .where(Word.word_id == word_id, db.or_(Word.picture.is_(None), Word.picture == row.picture))
+            .values(picture=path)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if updated:
+            return path
+        os.remove(path)
+        return db.session.execute(select(Word.picture).where(Word.word_id == word_id)).scalar()
+
+    return _flight.do(word_id, generate)
+
+
+def prefetch_word_pictures(app, classification, concurrency=4, limit=None, logger=None):
+    """
+    为词书中还没有本地插图的单词生成插图，最多 concurrency 个并发上游调用
+    picture 为空或指向远程地址(可能已过期)、本地文件不存在的单词都会处理，与 illustrate_word 的判断一致；
+    中断后重新运行即从剩下的单词继续；返回 (成功数, 失败数)
+    """
+    with app.app_context():
+        rows = db.session.execute(
+            select(Word.word_id, Word.picture)
+            .where(Word.classification == classification)
+            .order_by(Word.word_id)
+        ).all()
+    word_ids = [row.word_id for row in rows if cached_picture(row.picture) is None][:limit]
+
+    def run(word_id):
+        with app.app_context():
+            try:
+                illustrate_word(word_id)
+                return True
+            except Exception as e:
+                if logger:
+                    logger.warning(f"单词 {word_id} 插图生成失败: {e}")
+                return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, word_ids))
+    return results.count(True), results.count(False)
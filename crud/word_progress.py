@@ -0,0 +1,126 @@
+# 用户词书学习进度
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from sql_alchemy import db, Word, UserWordMastery, UserClassificationProgress, WordCatalogVersion
+
+
+def get_cursor(user_id, classification):
+    cursor = db.session.query(UserClassificationProgress.cursor_word_id).filter_by(
+        user_id=user_id,
+        classification=classification
+    ).scalar()
+    return cursor or 0
+
+
+def save_cursor(user_id, classification, cursor_word_id):
+    """只会前移，多个请求并发保存时保留较大的值"""
+    statement = insert(UserClassificationProgress).values(
+        user_id=user_id,
+        classification=classification,
+        cursor_word_id=cursor_word_id
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserClassificationProgress.user_id, UserClassificationProgress.classification],
+        set_={'cursor_word_id': func.max(UserClassificationProgress.cursor_word_id, statement.excluded.cursor_word_id)}
+    )
+    db.session.execute(statement)
+    db.session.commit()
+
+
+def get_next_words(user_id, classification, cursor=None, limit=10):
+    """
+    取词书中下一批没学过的单词
+    cursor 为上一批最后一个 word_id；不传时从保存的进度开始，并顺带把进度推进到第一个没学过的单词之前
+    返回 (word_id 列表, 本次起始位置)，单词内容从词库缓存读取
+    """
+    start = cursor if cursor is not None else get_cursor(user_id, classification)
+
+    # 沿 (classification, word_id) 索引直接定位，用反连接跳过已学过的单词
+    seen = exists().where(
+        UserWordMastery.user_id == user_id,
+        UserWordMastery.word_id == Word.word_id
+    )
+    word_ids = db.session.execute(
+        select(Word.word_id).where(
+            Word.classification == classification,
+            Word.word_id > start,
+            ~seen
+        ).order_by(Word.word_id).limit(limit)
+    ).scalars().all()
+
+    if cursor is None:
+        if word_ids:
+            frontier = word_ids[0] - 1
+        else:
+            frontier = db.session.query(func.max(Word.word_id)).filter_by(classification=classification).scalar() or 0
+        if frontier > start:
+            save_cursor(user_id, classification, frontier)
+    return word_ids, start
+
+
+def mastery_counts(is_mastered):
+    """一条掌握记录对 (mastered_count, unknown_count) 的贡献"""
+    return int(is_mastered == 1), int(is_mastered == 0)
+
+
+def update_progress_counts(user_id, deltas):
+    """
+    按增量更新用户词书进度计数，和掌握记录在同一事务内执行，由调用方负责 commit
+    deltas: {classification: (mastered_count 增量, unknown_count 增量)}
+    """
+    rows = [{
+        'user_id': user_id,
+        'classification': classification,
+        'cursor_word_id': 0,
+        'mastered_count': mastered,
+        'unknown_count': unknown
+    } for classification, (mastered, unknown) in deltas.items() if classification and (mastered or unknown)]
+    if not rows:
+        return
+    statement = insert(UserClassificationProgress).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserClassificationProgress.user_id, UserClassificationProgress.classification],
+        set_={
+            'mastered_count': UserClassificationProgress.mastered_count + statement.excluded.mastered_count,
+            'unknown_count': UserClassificationProgress.unknown_count + statement.excluded.unknown_count
+        }
+    )
+    db.session.execute(statement)
+
+
+def _progress_to_dict(classification, word_count, mastered_count, unknown_count):
+    learned_count = mastered_count + unknown_count
+    return {
+        'classification': classification,
+        'word_count': word_count,
+        'mastered_count': mastered_count,
+        'unknown_count': unknown_count,
+        'percent': round(learned_count / word_count * 100) if word_count else 0
+    }
+
+
+def get_progress(user_id, classification):
+    """读取计数器得到用户在一本词书中的进度，两次主键查找，不扫描掌握记录"""
+    word_count = db.session.query(WordCatalogVersion.word_count).filter_by(classification=classification).scalar()
+    counts = db.session.query(
+        UserClassificationProgress.mastered_count,
+        UserClassificationProgress.unknown_count
+    ).filter_by(user_id=user_id, classification=classification).first()
+    mastered_count, unknown_count = counts if counts else (0, 0)
+    return _progress_to_dict(classification, word_count or 0, mastered_count, unknown_count)
+
+
+def list_progress(user_id):
+    """用户学过的所有词书的进度"""
+    rows = db.session.execute(
+        select(
+            UserClassificationProgress.classification,
+            WordCatalogVersion.word_count,
+            UserClassificationProgress.mastered_count,
+            UserClassificationProgress.unknown_count
+        ).join(
+            WordCatalogVersion, WordCatalogVersion.classification == UserClassificationProgress.classification
+        ).where(UserClassificationProgress.user_id == user_id).order_by(UserClassificationProgress.classification)
+    ).all()
+    return [_progress_to_dict(*row) for row in rows if row.mastered_count or row.unknown_count]
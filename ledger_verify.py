@@ -0,0 +1,101 @@
+# 词力值账本校验
+# 用法: python ledger_verify.py [数据库文件] [--workers N]
+# 已有检查点的区块分发到进程池并行校验(链接、Merkle 根、签名)，区块之间校验首尾衔接，
+# 最后一个检查点之后的交易按块流式校验链接；发现问题即以非零状态退出
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from crud.ledger_checkpoint import CHECKPOINT_BLOCK_SIZE, TRANSACTION_COLUMNS, \
+    checkpoint_secret, sign_checkpoint, chain_breaks, transactions_after
+from sql_alchemy import TradeTransaction, LedgerCheckpoint
+from utils.Merkle import transaction_leaf, merkle_root
+
+_engine = None
+
+
+def _worker_engine(url):
+    # 每个子进程复用一个引擎
+    global _engine
+    if _engine is None:
+        _engine = create_engine(url)
+    return _engine
+
+
+def verify_block(url, checkpoint, secret):
+    """校验一个检查点区块，返回问题列表"""
+    start_tx_id, end_tx_id, start_previous_hash, end_hash, root, signature = checkpoint
+    errors = []
+    if sign_checkpoint(start_tx_id, end_tx_id, start_previous_hash, end_hash, root, secret) != signature:
+        errors.append(f"检查点 {start_tx_id}-{end_tx_id} 签名无效")
+
+    with Session(_worker_engine(url)) as session:
+        rows = session.execute(
+            select(*TRANSACTION_COLUMNS)
+            .where(TradeTransaction.trade_transaction_id.between(start_tx_id, end_tx_id))
+            .order_by(TradeTransaction.trade_transaction_id)
+        ).all()
+    if not rows:
+        return errors + [f"检查点 {start_tx_id}-{end_tx_id} 的交易不存在"]
+
+    errors += [f"交易 {tx_id} 的 previous_hash 与上一笔交易不一致" for tx_id in chain_breaks(rows)]
+    if rows[0].previous_hash != start_previous_hash or rows[-1].current_hash != end_hash:
+        errors.append(f"检查点 {start_tx_id}-{end_tx_id} 首尾 hash 不一致")
+    if merkle_root([transaction_leaf(row) for row in rows]) != root:
+        errors.append(f"检查点 {start_tx_id}-{end_tx_id} Merkle 根不一致")
+    return errors
+
+
+def verify_ledger(url, workers=None, chunk_size=CHECKPOINT_BLOCK_SIZE):
+    secret = checkpoint_secret()  # 没有密钥时直接失败，不做不完整的校验
+    engine = create_engine(url)
+    with Session(engine) as session:
+        checkpoints = session.execute(
+            select(LedgerCheckpoint.start_tx_id, LedgerCheckpoint.end_tx_id, LedgerCheckpoint.start_previous_hash,
+                   LedgerCheckpoint.end_hash, LedgerCheckpoint.merkle_root, LedgerCheckpoint.signature)
+            .order_by(LedgerCheckpoint.end_tx_id)
+        ).all()
+
+    errors = []
+    # 区块之间的衔接: 每个区块的第一笔交易链接到上一个区块的最后一笔
+    for previous, checkpoint in zip(checkpoints, checkpoints[1:]):
+        if checkpoint.start_previous_hash != previous.end_hash:
+            errors.append(f"检查点 {previous.end_tx_id} 与 {checkpoint.start_tx_id} 之间链接断开")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(verify_block, url, tuple(checkpoint), secret) for checkpoint in checkpoints]
+        for future in futures:
+            errors += future.result()
+
+    # 尚未生成检查点的交易: 按块流式读取，只校验链接
+    after_tx_id, previous_hash = (checkpoints[-1].end_tx_id, checkpoints[-1].end_hash) if checkpoints else (0, None)
+    tail_count = 0
+    with Session(engine) as session:
+        while True:
+            rows = transactions_after(session, after_tx_id, chunk_size)
+            if not rows:
+                break
+            errors += [f"交易 {tx_id} 的 previous_hash 与上一笔交易不一致" for tx_id in chain_breaks(rows, previous_hash)]
+            tail_count += len(rows)
+            after_tx_id, previous_hash = rows[-1].trade_transaction_id, rows[-1].current_hash
+    engine.dispose()
+    return len(checkpoints), tail_count, errors
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    workers = None
+    if '--workers' in args:
+        index = args.index('--workers')
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    path = args[0] if args else os.path.join('instance', 'chat_app.sqlite3')
+
+    checkpoint_count, tail_count, errors = verify_ledger(f'sqlite:///{os.path.abspath(path)}', workers)
+    for error in errors:
+        print(error)
+    print(f"校验检查点区块 {checkpoint_count} 个，未生成检查点的交易 {tail_count} 笔，问题 {len(errors)} 个")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,159 @@
+# 数据库迁移
+# 版本号记录在 SQLite 的 PRAGMA user_version 中，应用启动时按顺序执行尚未执行过的迁移
+# 新增迁移: 在 MIGRATIONS 末尾追加 (版本号, 说明, 步骤)，步骤是 SQL 语句或接收连接的函数；
+# 同时修改 sql_alchemy.py 中的模型，并运行 python migrations.py --dump-schema 更新 sql.sql
+# 迁移中的 DDL 直接写成 SQL 文本，不引用当前模型；已发布的迁移不再修改，结构调整一律追加新的迁移
+import sys
+
+from sqlalchemy import inspect, create_engine
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from sql_alchemy import db, WORD_CATALOG_TRIGGERS, WORD_COUNT_TRIGGERS
+
+
+def add_column(table, column_ddl):
+    """添加列，列已存在则跳过"""
+    def step(conn):
+        name = column_ddl.split()[0]
+        columns = [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")')]
+        if name not in columns:
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {column_ddl}')
+    return step
+
+
+# 按掌握记录重新计算用户词书进度计数
+REBUILD_PROGRESS_COUNTS = [
+    "INSERT OR IGNORE INTO user_classification_progress (user_id, classification, cursor_word_id) "
+    "SELECT DISTINCT user_id, word_type, 0 FROM user_word_mastery",
+    "UPDATE user_classification_progress SET "
+    "mastered_count = (SELECT count(*) FROM user_word_mastery WHERE user_word_mastery.user_id = user_classification_progress.user_id "
+    "AND user_word_mastery.word_type = user_classification_progress.classification AND is_mastered = 1), "
+    "unknown_count = (SELECT count(*) FROM user_word_mastery WHERE user_word_mastery.user_id = user_classification_progress.user_id "
+    "AND user_word_mastery.word_type = user_classification_progress.classification AND is_mastered = 0)",
+]
+
+MIGRATIONS = [
+    (1, '热点查询索引', [
+        "CREATE INDEX IF NOT EXISTS ix_word_classification_word_id ON word (classification, word_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_word_mastery_user_id_word_id ON user_word_mastery (user_id, word_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_word_mastery_user_id_word_type_is_mastered ON user_word_mastery (user_id, word_type, is_mastered)",
+        "CREATE INDEX IF NOT EXISTS ix_user_word_mastery_user_id_created_at ON user_word_mastery (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id_agent_id_created_at ON chat_messages (user_id, agent_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_word_friend_user_id_name ON word_friend (user_id, name)",
+        "CREATE INDEX IF NOT EXISTS ix_trade_transaction_sender ON trade_transaction (sender)",
+        "CREATE INDEX IF NOT EXISTS ix_trade_transaction_receiver ON trade_transaction (receiver)",
+        "CREATE INDEX IF NOT EXISTS ix_trade_transaction_created_at ON trade_transaction (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_story_collection_user_id_title ON story_collection (user_id, title)",
+        "CREATE INDEX IF NOT EXISTS ix_user_achievement_user_id_name ON user_achievement (user_id, name)",
+    ]),
+    (2, '词书版本号触发器', [
+        *WORD_CATALOG_TRIGGERS,
+        "INSERT OR IGNORE INTO word_catalog_version (classification, version) SELECT DISTINCT classification, 1 FROM word",
+    ]),
+    (3, '掌握记录唯一索引(支持批量 upsert)', [
+        # 清理重复记录，保留最早的一条
+        "DELETE FROM user_word_mastery WHERE user_word_mastery_id NOT IN ("
+        "SELECT MIN(user_word_mastery_id) FROM user_word_mastery GROUP BY user_id, word_id, word_type)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_user_word_mastery_user_id_word_id_word_type "
+        "ON user_word_mastery (user_id, word_id, word_type)",
+        "DROP INDEX IF EXISTS ix_user_word_mastery_user_id_word_id",
+    ]),
+    (4, '钱包交易记录游标分页索引和交易后余额', [
+        "CREATE INDEX IF NOT EXISTS ix_trade_transaction_sender_created_at "
+        "ON trade_transaction (sender, created_at, trade_transaction_id)",
+        "CREATE INDEX IF NOT EXISTS ix_trade_transaction_receiver_created_at "
+        "ON trade_transaction (receiver, created_at, trade_transaction_id)",
+        "DROP INDEX IF EXISTS ix_trade_transaction_sender",
+        "DROP INDEX IF EXISTS ix_trade_transaction_receiver",
+        add_column('trade_transaction', 'sender_balance INTEGER'),
+        add_column('trade_transaction', 'receiver_balance INTEGER'),
+    ]),
+    (5, '按单词查插图索引', ["CREATE INDEX IF NOT EXISTS ix_word_word_en ON word (word_en)"]),
+    (6, '词书单词数和用户词书进度计数', [
+        add_column('word_catalog_version', 'word_count INTEGER NOT NULL DEFAULT 0'),
+        *WORD_COUNT_TRIGGERS,
+        "UPDATE word_catalog_version SET word_count = ("
+        "SELECT count(*) FROM word WHERE word.classification = word_catalog_version.classification)",
+        add_column('user_classification_progress', 'mastered_count INTEGER NOT NULL DEFAULT 0'),
+        add_column('user_classification_progress', 'unknown_count INTEGER NOT NULL DEFAULT 0'),
+        *REBUILD_PROGRESS_COUNTS,
+    ]),
+    (7, '回填最近两天的每日计数', [
+        # 每日计数表上线前当天的掌握记录没有计入；更早的计数会被每日任务清理，不需要回填
+        "INSERT OR REPLACE INTO user_daily_count (user_id, learning_date, word_count) "
+        "SELECT user_id, DATE(created_at), count(*) FROM user_word_mastery "
+        "WHERE created_at >= DATE('now', 'localtime', '-1 day') GROUP BY user_id, DATE(created_at)",
+    ]),
+    (8, '删除不再使用的交易时间索引(账本改为按链头追加)', ["DROP INDEX IF EXISTS ix_trade_transaction_created_at"]),
+    (9, '补全掌握记录的词书', [
+        # word_type 为 NULL 时唯一索引不生效，按单词所在词书补全；补全后与已有记录重复的直接删除
+        "UPDATE OR IGNORE user_word_mastery SET word_type = ("
+        "SELECT classification FROM word WHERE word.word_id = user_word_mastery.word_id) WHERE word_type IS NULL",
+        "DELETE FROM user_word_mastery WHERE word_type IS NULL AND EXISTS ("
+        "SELECT 1 FROM user_word_mastery AS other WHERE other.user_id = user_word_mastery.user_id "
+        "AND other.word_id = user_word_mastery.word_id AND other.word_type IS NOT NULL)",
+        *REBUILD_PROGRESS_COUNTS,
+    ]),
+    # 旧检查点的 Merkle 树没有叶子/内部节点前缀，由定时任务按新结构重新生成
+    (10, '按 RFC 6962 结构重建账本检查点', ["DELETE FROM ledger_checkpoint"]),
+    (11, '用户会话代数(refresh 令牌只能使用一次)', [
+        add_column('user', 'session_generation INTEGER NOT NULL DEFAULT 0'),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(engine, logger=None):
+    """创建缺失的表并执行未完成的迁移，返回迁移后的版本号"""
+    with engine.connect() as conn:
+        # 获取写锁，多个 worker 同时启动时串行执行
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            is_new_database = not inspect(conn).has_table('user')
+            db.metadata.create_all(conn)  # 新表(含索引)直接按模型创建
+            version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+            if is_new_database:
+                version = LATEST_VERSION  # 全新数据库按模型创建后已是最新结构
+
+            for migration_version, description, steps in MIGRATIONS:
+                if migration_version <= version:
+                    continue
+                if logger:
+                    logger.info(f"执行数据库迁移 {migration_version}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.exec_driver_sql(step)
+                version = migration_version
+
+            conn.exec_driver_sql(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
+
+
+def dump_schema():
+    """按模型生成建表语句"""
+    engine = create_engine('sqlite://')
+    statements = []
+    for table in db.metadata.sorted_tables:
+        statements.append(CreateTable(table, if_not_exists=True))
+        statements.extend(CreateIndex(index, if_not_exists=True) for index in sorted(table.indexes, key=lambda index: index.name))
+    statements = [str(statement.compile(engine)) for statement in statements] + WORD_CATALOG_TRIGGERS + WORD_COUNT_TRIGGERS
+    return '\n\n'.join(
+        '\n'.join(line.rstrip() for line in statement.strip().splitlines()) + ';'
+        for statement in statements
+    ) + '\n'
+
+
+if __name__ == '__main__':
+    if '--dump-schema' in sys.argv:
+        with open('sql.sql', 'w', encoding='utf-8') as f:
+            f.write('-- 由 sql_alchemy.py 中的模型生成，请勿手工修改: python migrations.py --dump-schema\n\n')
+            f.write(dump_schema())
+    else:
+        print('用法: python migrations.py --dump-schema')
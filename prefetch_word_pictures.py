@@ -0,0 +1,46 @@
+# 预先生成词书的单词插图
+# 用法: python prefetch_word_pictures.py 词书 [--concurrency N] [--limit N]
+# 例如 python prefetch_word_pictures.py CET4 --concurrency 4，中断后重新运行会从还没有本地插图的单词继续
+import os
+import sys
+
+from flask import Flask
+
+from crud.word_picture import prefetch_word_pictures
+from sql_alchemy import db, SQLITE_PROFILES, apply_sqlite_pragmas
+
+
+def create_prefetch_app():
+    # 与 script.py 使用同一个数据库，但不启动定时任务和后台队列
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chat_app.sqlite3'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    profile = SQLITE_PROFILES[os.getenv('SQLITE_PROFILE', 'production')]
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = profile['engine_options']
+    db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, profile['pragmas'])
+    return app
+
+
+def option(args, name, default=None):
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = int(args[index + 1])
+    del args[index:index + 2]
+    return value
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    concurrency = option(args, '--concurrency', 4)
+    limit = option(args, '--limit')
+    if not args:
+        print('用法: python prefetch_word_pictures.py 词书 [--concurrency N] [--limit N]')
+        sys.exit(1)
+
+    app = create_prefetch_app()
+    succeeded, failed = prefetch_word_pictures(app, args[0], concurrency, limit, app.logger)
+    print(f"{args[0]}: 生成插图 {succeeded} 个，失败 {failed} 个")
+    sys.exit(1 if failed else 0)
@@ -1,131 +1,294 @@
--- 用户表
+-- 由 sql_alchemy.py 中的模型生成，请勿手工修改: python migrations.py --dump-schema
+
+CREATE TABLE IF NOT EXISTS ai_agent (
+	agent_id INTEGER NOT NULL,
+	name VARCHAR(50) NOT NULL,
+	description TEXT,
+	system_prompt TEXT NOT NULL,
+	avatar_url VARCHAR(255),
+	is_active BOOLEAN,
+	created_at DATETIME,
+	updated_at DATETIME,
+	PRIMARY KEY (agent_id),
+	UNIQUE (name)
+);
+
+CREATE TABLE IF NOT EXISTS image_job (
+	image_job_id VARCHAR(16) NOT NULL,
+	kind VARCHAR(32) NOT NULL,
+	params TEXT NOT NULL,
+	status VARCHAR(16) NOT NULL,
+	result TEXT,
+	error TEXT,
+	attempts INTEGER NOT NULL,
+	locked_until DATETIME,
+	created_at DATETIME,
+	updated_at DATETIME,
+	PRIMARY KEY (image_job_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_image_job_status_locked_until ON image_job (status, locked_until);
+
+CREATE INDEX IF NOT EXISTS ix_image_job_updated_at ON image_job (updated_at);
+
+CREATE TABLE IF NOT EXISTS ledger_checkpoint (
+	ledger_checkpoint_id INTEGER NOT NULL,
+	start_tx_id INTEGER NOT NULL,
+	end_tx_id INTEGER NOT NULL,
+	tx_count INTEGER NOT NULL,
+	start_previous_hash VARCHAR(100) NOT NULL,
+	end_hash VARCHAR(100) NOT NULL,
+	merkle_root VARCHAR(64) NOT NULL,
+	signature VARCHAR(64) NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (ledger_checkpoint_id),
+	UNIQUE (end_tx_id)
+);
+
+CREATE TABLE IF NOT EXISTS ledger_head (
+	ledger_head_id INTEGER NOT NULL,
+	head_hash VARCHAR(100) NOT NULL,
+	tx_count INTEGER NOT NULL,
+	updated_at DATETIME,
+	PRIMARY KEY (ledger_head_id)
+);
+
 CREATE TABLE IF NOT EXISTS user (
-    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT NOT NULL UNIQUE,
-    email TEXT NOT NULL UNIQUE,
-    password_hash TEXT NOT NULL,
-    avatar_url TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+	user_id INTEGER NOT NULL,
+	username VARCHAR(50) NOT NULL,
+	email VARCHAR(100) NOT NULL,
+	avatar_url VARCHAR(255),
+	created_at DATETIME,
+	updated_at DATETIME,
+	wechat_openid VARCHAR(100) NOT NULL,
+	wechat_session_key VARCHAR(100) NOT NULL,
+	preferred_classification VARCHAR(100) NOT NULL,
+	preferred_plan_daily INTEGER,
+	wallet_key VARCHAR(100) NOT NULL,
+	word_power_amount INTEGER NOT NULL,
+	is_deleted INTEGER NOT NULL,
+	session_generation INTEGER DEFAULT '0' NOT NULL,
+	PRIMARY KEY (user_id),
+	UNIQUE (username),
+	UNIQUE (email),
+	UNIQUE (wechat_openid),
+	UNIQUE (wallet_key)
 );
 
--- AI Agent表
-CREATE TABLE IF NOT EXISTS ai_agent (
-    agent_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL UNIQUE,
-    description TEXT,
-    system_prompt TEXT NOT NULL,
-    avatar_url TEXT,
-    is_active INTEGER NOT NULL DEFAULT 1,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+CREATE TABLE IF NOT EXISTS word (
+	word_id INTEGER NOT NULL,
+	word_en VARCHAR(100) NOT NULL,
+	word_cn VARCHAR(100) NOT NULL,
+	example_sentense_en TEXT NOT NULL,
+	example_sentense_cn TEXT NOT NULL,
+	usphone VARCHAR(50) NOT NULL,
+	picture VARCHAR(255),
+	classification VARCHAR(100) NOT NULL,
+	PRIMARY KEY (word_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_word_classification_word_id ON word (classification, word_id);
+
+CREATE INDEX IF NOT EXISTS ix_word_word_en ON word (word_en);
+
+CREATE TABLE IF NOT EXISTS word_catalog_version (
+	classification VARCHAR(100) NOT NULL,
+	version INTEGER NOT NULL,
+	word_count INTEGER DEFAULT '0' NOT NULL,
+	PRIMARY KEY (classification)
+);
+
+CREATE TABLE IF NOT EXISTS word_friend_level_config (
+	word_friend_level_config_id INTEGER NOT NULL,
+	exp_level INTEGER NOT NULL,
+	exp_require INTEGER NOT NULL,
+	PRIMARY KEY (word_friend_level_config_id)
 );
 
--- 聊天消息表
 CREATE TABLE IF NOT EXISTS chat_messages (
-    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
+	message_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
 	agent_id INTEGER NOT NULL,
-    sender_type TEXT NOT NULL CHECK(sender_type IN ('user', 'agent')),
-    content TEXT NOT NULL,
-    tokens INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES user(user_id),
-	FOREIGN KEY (agent_id) REFERENCES ai_agent(user_id)
+	sender_type VARCHAR(10) NOT NULL,
+	content TEXT NOT NULL,
+	tokens INTEGER,
+	created_at DATETIME,
+	PRIMARY KEY (message_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id),
+	FOREIGN KEY(agent_id) REFERENCES ai_agent (agent_id)
 );
 
--- 单词伙伴表
-CREATE TABLE IF NOT EXISTS word_friend (
-    word_friend_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL UNIQUE,
-    level INTEGER NOT NULL DEFAULT 0, -- 等级
-    exp INTEGER NOT NULL DEFAULT 0, -- 经验值
-    user_id INTEGER NOT NULL,
-    FOREIGN KEY (user_id) REFERENCES user(user_id)
-)
-
--- 单词表
-CREATE TABLE IF NOT EXISTS word (
-    word_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    word_en TEXT NOT NULL,
-    word_cn TEXT NOT NULL,
-    example_sentense_en TEXT NOT NULL,
-    example_sentense_cn TEXT NOT NULL,
-    usphone TEXT NOT NULL,
-    picture TEXT,
-    word_type TEXT NOT NULL
-)
-
--- 用户单词掌握表, 如果有记录说明掌握了
-CREATE TABLE IF NOT EXISTS user_word_mastery (
-    user_word_mastery_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    word_id INTEGER NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES user(user_id),
-    FOREIGN KEY (word_id) REFERENCES word(word_id)
-)
-
-CREATE TABLE IF NOT EXISTS word_friend_level_config(
-	word_friend_level_config_id INTEGER PRIMARY KEY AUTOINCREMENT,
-	exp_level INTEGER NOT NULL UNIQUE, -- 等级
-	exp_require INTEGER NOT NULL -- 升级到该等级所需经验
-)
-
--- 用户成就表, 创建用户即把所有成就copy一份进来
-/**
-  {
-			icon: '🔥',
-			name: '坚持不懈',
-			desc: '连续学习30天',
-			unlocked: true
-		},
-		{
-			icon: '📚',
-			name: '词汇大师',
-			desc: '掌握500个单词',
-		},
-		{
-			icon: '⚡',
-			name: '速记能手',
-			desc: '单日记忆50个单词',
-		},
-		{
-			icon: '🚀',
-			name: '突破极限',
-			desc: '连续学习100天',
-		}
- */
-CREATE TABLE IF NOT EXISTS user_achievement(
-    user_achievement_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    description TEXT,
-    icon TEXT,
-    is_active INTEGER DEFAULT 0, -- 0无1有
-)
-
-CREATE TABLE IF NOT EXISTS trade_transaction(
-    trade_transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    sender TEXT NOT NULL,
-    receiver TEXT NOT NULL,
+CREATE INDEX IF NOT EXISTS ix_chat_messages_user_id_agent_id_created_at ON chat_messages (user_id, agent_id, created_at);
+
+CREATE TABLE IF NOT EXISTS chat_summary (
+	user_id INTEGER NOT NULL,
+	agent_id INTEGER NOT NULL,
+	summary TEXT NOT NULL,
+	last_message_id INTEGER NOT NULL,
+	tokens INTEGER NOT NULL,
+	updated_at DATETIME,
+	PRIMARY KEY (user_id, agent_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id),
+	FOREIGN KEY(agent_id) REFERENCES ai_agent (agent_id)
+);
+
+CREATE TABLE IF NOT EXISTS story_collection (
+	id INTEGER NOT NULL,
+	title VARCHAR(100) NOT NULL,
+	content TEXT NOT NULL,
+	content_zh TEXT NOT NULL,
+	cover_img VARCHAR(255),
+	selected_words TEXT,
+	created_at DATETIME,
+	user_id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_story_collection_user_id_title ON story_collection (user_id, title);
+
+CREATE TABLE IF NOT EXISTS trade_transaction (
+	trade_transaction_id INTEGER NOT NULL,
+	sender VARCHAR(100) NOT NULL,
+	receiver VARCHAR(100) NOT NULL,
 	amount INTEGER NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    previous_hash TEXT,
-	current_hash TEXT
-)
-
-CREATE TABLE IF NOT EXISTS story_collection(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    title TEXT,
-    content TEXT,
-    content_zh TEXT,
-    cover_img TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-
-CREATE TABLE TABLE IF NOT EXISTS "user_story_collection_ref" (
-	"id"	INTEGER,
-	"user_id"	INTEGER NOT NULL,
-	"story_collection_id"	INTEGER NOT NULL,
-	PRIMARY KEY("id" AUTOINCREMENT)
-)
+	created_at DATETIME,
+	previous_hash VARCHAR(100) NOT NULL,
+	current_hash VARCHAR(100) NOT NULL,
+	sender_balance INTEGER,
+	receiver_balance INTEGER,
+	PRIMARY KEY (trade_transaction_id),
+	FOREIGN KEY(sender) REFERENCES user (wallet_key),
+	FOREIGN KEY(receiver) REFERENCES user (wallet_key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_trade_transaction_receiver_created_at ON trade_transaction (receiver, created_at, trade_transaction_id);
+
+CREATE INDEX IF NOT EXISTS ix_trade_transaction_sender_created_at ON trade_transaction (sender, created_at, trade_transaction_id);
+
+CREATE TABLE IF NOT EXISTS user_achievement (
+	user_achievement_id INTEGER NOT NULL,
+	name VARCHAR(50) NOT NULL,
+	description TEXT,
+	icon VARCHAR(255),
+	is_active BOOLEAN,
+	user_id INTEGER NOT NULL,
+	PRIMARY KEY (user_achievement_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_achievement_user_id_name ON user_achievement (user_id, name);
+
+CREATE TABLE IF NOT EXISTS user_activity_calendar (
+	user_id INTEGER NOT NULL,
+	start_date DATE,
+	bits BLOB NOT NULL,
+	learning_days INTEGER NOT NULL,
+	current_streak INTEGER NOT NULL,
+	longest_streak INTEGER NOT NULL,
+	last_date DATE,
+	PRIMARY KEY (user_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_classification_progress (
+	user_id INTEGER NOT NULL,
+	classification VARCHAR(100) NOT NULL,
+	cursor_word_id INTEGER NOT NULL,
+	mastered_count INTEGER DEFAULT '0' NOT NULL,
+	unknown_count INTEGER DEFAULT '0' NOT NULL,
+	PRIMARY KEY (user_id, classification),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_daily_count (
+	user_id INTEGER NOT NULL,
+	learning_date DATE NOT NULL,
+	word_count INTEGER NOT NULL,
+	PRIMARY KEY (user_id, learning_date),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_profile (
+	user_id INTEGER NOT NULL,
+	mastery_word_count INTEGER NOT NULL,
+	learning_days INTEGER NOT NULL,
+	last_learning_date DATE,
+	word_friend TEXT,
+	updated_at DATETIME,
+	PRIMARY KEY (user_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_word_mastery (
+	user_word_mastery_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	word_id INTEGER NOT NULL,
+	word_type VARCHAR(50),
+	created_at DATETIME,
+	is_mastered INTEGER NOT NULL,
+	PRIMARY KEY (user_word_mastery_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id),
+	FOREIGN KEY(word_id) REFERENCES word (word_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_word_mastery_user_id_created_at ON user_word_mastery (user_id, created_at);
+
+CREATE INDEX IF NOT EXISTS ix_user_word_mastery_user_id_word_type_is_mastered ON user_word_mastery (user_id, word_type, is_mastered);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_user_word_mastery_user_id_word_id_word_type ON user_word_mastery (user_id, word_id, word_type);
+
+CREATE TABLE IF NOT EXISTS word_friend (
+	word_friend_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	level INTEGER NOT NULL,
+	exp INTEGER NOT NULL,
+	nickname VARCHAR(100),
+	PRIMARY KEY (word_friend_id),
+	FOREIGN KEY(user_id) REFERENCES user (user_id),
+	UNIQUE (name)
+);
+
+CREATE INDEX IF NOT EXISTS ix_word_friend_user_id_name ON word_friend (user_id, name);
+
+CREATE TRIGGER IF NOT EXISTS trg_word_catalog_insert AFTER INSERT ON word
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (NEW.classification, 0);
+        UPDATE word_catalog_version SET version = version + 1 WHERE classification = NEW.classification;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS trg_word_catalog_update AFTER UPDATE ON word
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (OLD.classification, 0);
+        UPDATE word_catalog_version SET version = version + 1 WHERE classification = OLD.classification;
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (NEW.classification, 0);
+        UPDATE word_catalog_version SET version = version + 1 WHERE classification = NEW.classification;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS trg_word_catalog_delete AFTER DELETE ON word
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (OLD.classification, 0);
+        UPDATE word_catalog_version SET version = version + 1 WHERE classification = OLD.classification;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS trg_word_count_insert AFTER INSERT ON word
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (NEW.classification, 0);
+        UPDATE word_catalog_version SET word_count = word_count + (1) WHERE classification = NEW.classification;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS trg_word_count_update AFTER UPDATE OF classification ON word
+    WHEN OLD.classification IS NOT NEW.classification
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (OLD.classification, 0);
+        UPDATE word_catalog_version SET word_count = word_count + (-1) WHERE classification = OLD.classification;
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (NEW.classification, 0);
+        UPDATE word_catalog_version SET word_count = word_count + (1) WHERE classification = NEW.classification;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS trg_word_count_delete AFTER DELETE ON word
+    BEGIN
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES (OLD.classification, 0);
+        UPDATE word_catalog_version SET word_count = word_count + (-1) WHERE classification = OLD.classification;
+    END;
@@ -2,9 +2,50 @@ import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from json import loads
+from sqlalchemy import event
 
 db = SQLAlchemy()
 
+# SQLite 引擎配置
+# pragmas 在每个新连接上执行；engine_options 传给 create_engine
+SQLITE_PROFILES = {
+    # SQLAlchemy 默认配置(回滚日志模式)，仅用于对比测试
+    'default': {
+        'pragmas': {},
+        'engine_options': {},
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',  # 读写互不阻塞，多个 worker 同时读不再等待写锁
+            'synchronous': 'NORMAL',  # WAL 模式下只在检查点时 fsync，掉电最多丢失最后几个事务
+            'cache_size': -64000,  # 每个连接 64MB 页缓存(负数单位为KB)
+            'mmap_size': 256 * 1024 * 1024,  # 读取走内存映射，减少系统调用
+            'busy_timeout': 5000,  # 写锁冲突时最多等待5秒；等待发生在C层，会阻塞整个 gevent worker，不宜过长
+            'temp_store': 'MEMORY',
+        },
+        'engine_options': {
+            # 每个 worker 最多 50 个 gevent 协程(worker_connections)，连接池上限与之对齐，避免协程排队等连接
+            'pool_size': 10,
+            'max_overflow': 40,
+            'pool_timeout': 10,
+            'connect_args': {'check_same_thread': False},
+        },
+    },
+}
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """在引擎的每个新连接上执行 PRAGMA"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -22,6 +63,7 @@ class User(db.Model):
     wallet_key = db.Column(db.String(100), nullable=False, unique=True) # 钱包唯一标识
     word_power_amount = db.Column(db.Integer, nullable=False, default=0) # 词力值
     is_deleted = db.Column(db.Integer, nullable=False, default=0)
+    session_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 会话代数，refresh 令牌每用一次加一
 
     stories = db.relationship('StoryCollection', backref='user')
     word_friend = db.relationship('WordFriend', backref='user')
@@ -41,6 +83,9 @@ class AIAgent(db.Model):
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_user_id_agent_id_created_at', 'user_id', 'agent_id', 'created_at'),  # 会话消息
+    )
 
     message_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
@@ -48,11 +93,14 @@ class ChatMessage(db.Model):
     sender_type = db.Column(db.String(10), nullable=False)  # 'user' or 'agent'
     content = db.Column(db.Text, nullable=False)
     tokens = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
 
 class WordFriend(db.Model):
     __tablename__ = 'word_friend'
+    __table_args__ = (
+        db.Index('ix_word_friend_user_id_name', 'user_id', 'name'),  # 用户持有的词友
+    )
 
     word_friend_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
@@ -63,6 +111,10 @@ class WordFriend(db.Model):
 
 class Word(db.Model):
     __tablename__ = 'word'
+    __table_args__ = (
+        db.Index('ix_word_classification_word_id', 'classification', 'word_id'),  # 按词书顺序翻页
+        db.Index('ix_word_word_en', 'word_en'),  # 按单词查插图
+    )
 
     word_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     word_en = db.Column(db.String(100), nullable=False)
@@ -77,19 +129,30 @@ class Word(db.Model):
     mastered_by = db.relationship('UserWordMastery', back_populates='word')
 
     def to_dict(self):
-        return {
-            'word_id': self.word_id,
-            'word_en': self.word_en,
-            'word_cn': json.loads(self.word_cn),
-            'usphone': self.usphone,
-            'example_en': self.example_sentense_en,
-            'example_cn': self.example_sentense_cn,
-            'picture': self.picture,
-            "speech": f"https://dict.youdao.com/dictvoice?audio={self.word_en}&type=2"
-        }
+        return word_payload(self)
+
+
+def word_payload(word):
+    """单词返回给前端的数据，word 可以是 Word 对象或查询出的行"""
+    return {
+        'word_id': word.word_id,
+        'word_en': word.word_en,
+        'word_cn': json.loads(word.word_cn),
+        'usphone': word.usphone,
+        'example_en': word.example_sentense_en,
+        'example_cn': word.example_sentense_cn,
+        'picture': word.picture,
+        "speech": f"https://dict.youdao.com/dictvoice?audio={word.word_en}&type=2"
+    }
 
 class UserWordMastery(db.Model):
     __tablename__ = 'user_word_mastery'
+    __table_args__ = (
+        # 每个用户的每本词书中同一单词只有一条记录；前缀 (user_id, word_id) 同时用于判断用户是否学过某个单词
+        db.Index('ux_user_word_mastery_user_id_word_id_word_type', 'user_id', 'word_id', 'word_type', unique=True),
+        db.Index('ix_user_word_mastery_user_id_word_type_is_mastered', 'user_id', 'word_type', 'is_mastered'),  # 词书进度/生词本
+        db.Index('ix_user_word_mastery_user_id_created_at', 'user_id', 'created_at'),  # 按日期统计学习记录
+    )
 
     user_word_mastery_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False)
@@ -111,6 +174,9 @@ class WordFriendLevelConfig(db.Model):
 
 class UserAchievement(db.Model):
     __tablename__ = 'user_achievement'
+    __table_args__ = (
+        db.Index('ix_user_achievement_user_id_name', 'user_id', 'name'),  # 用户成就列表/解锁
+    )
     user_achievement_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text)
@@ -120,6 +186,11 @@ class UserAchievement(db.Model):
 
 class TradeTransaction(db.Model):
     __tablename__ = 'trade_transaction'
+    __table_args__ = (
+        # 钱包交易记录按 (created_at, trade_transaction_id) 游标分页，转出、转入各走一个索引
+        db.Index('ix_trade_transaction_sender_created_at', 'sender', 'created_at', 'trade_transaction_id'),
+        db.Index('ix_trade_transaction_receiver_created_at', 'receiver', 'created_at', 'trade_transaction_id'),
+    )
 
     trade_transaction_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     sender = db.Column(db.String(100), db.ForeignKey('user.wallet_key'), nullable=False)
@@ -128,9 +199,14 @@ class TradeTransaction(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now())
     previous_hash = db.Column(db.String(100), nullable=False)
     current_hash = db.Column(db.String(100), nullable=False)
+    sender_balance = db.Column(db.Integer) # 交易后发送者的余额，旧交易为空
+    receiver_balance = db.Column(db.Integer) # 交易后接收者的余额，旧交易为空
 
 class StoryCollection(db.Model):
     __tablename__ = 'story_collection'
+    __table_args__ = (
+        db.Index('ix_story_collection_user_id_title', 'user_id', 'title'),  # 判断是否已收藏
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(100), nullable=False)
@@ -152,3 +228,153 @@ class StoryCollection(db.Model):
             "selected_words": loads(self.selected_words) if self.selected_words else [],
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
+
+class UserProfile(db.Model):
+    __tablename__ = 'user_profile'
+
+    # 用户资料快照，写入掌握记录/词友时增量维护，避免每次读取都扫描 user_word_mastery
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    mastery_word_count = db.Column(db.Integer, nullable=False, default=0) # 学过的不同单词数
+    learning_days = db.Column(db.Integer, nullable=False, default=0) # 有学习记录的天数
+    last_learning_date = db.Column(db.Date) # 最近一次学习的日期
+    word_friend = db.Column(db.Text) # 当前词友信息(JSON)，无词友时为空
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+class UserActivityCalendar(db.Model):
+    __tablename__ = 'user_activity_calendar'
+
+    # 用户学习日历，位图见 utils/ActivityCalendar.py，每次写入掌握记录时维护
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    start_date = db.Column(db.Date) # 位图第0位对应的日期
+    bits = db.Column(db.LargeBinary, nullable=False, default=b'')
+    learning_days = db.Column(db.Integer, nullable=False, default=0) # 总学习天数
+    current_streak = db.Column(db.Integer, nullable=False, default=0) # 最近一段连续学习天数
+    longest_streak = db.Column(db.Integer, nullable=False, default=0) # 最长连续学习天数
+    last_date = db.Column(db.Date) # 最近一次学习的日期
+
+class UserDailyCount(db.Model):
+    __tablename__ = 'user_daily_count'
+
+    # 用户每天新增的掌握记录数
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    learning_date = db.Column(db.Date, primary_key=True)
+    word_count = db.Column(db.Integer, nullable=False, default=0)
+
+class UserClassificationProgress(db.Model):
+    __tablename__ = 'user_classification_progress'
+
+    # 用户在每本词书中的学习进度
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    classification = db.Column(db.String(100), primary_key=True)
+    cursor_word_id = db.Column(db.Integer, nullable=False, default=0) # 词书中 word_id 不大于此值的单词都已学过
+    # 写入掌握记录时在同一事务内增减，读取进度不再扫描 user_word_mastery
+    mastered_count = db.Column(db.Integer, nullable=False, default=0, server_default='0') # is_mastered = 1 的记录数
+    unknown_count = db.Column(db.Integer, nullable=False, default=0, server_default='0') # is_mastered = 0 的记录数(生词本)
+
+class WordCatalogVersion(db.Model):
+    __tablename__ = 'word_catalog_version'
+
+    # 词书版本号，word 表有任何增删改时由触发器递增，用于让进程内的词库缓存失效
+    classification = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    word_count = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 词书单词数，同样由触发器维护
+
+
+def _bump_catalog_version(classification):
+    return f"""
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES ({classification}, 0);
+        UPDATE word_catalog_version SET version = version + 1 WHERE classification = {classification};"""
+
+
+def _adjust_word_count(classification, delta):
+    return f"""
+        INSERT OR IGNORE INTO word_catalog_version (classification, version) VALUES ({classification}, 0);
+        UPDATE word_catalog_version SET word_count = word_count + ({delta}) WHERE classification = {classification};"""
+
+
+WORD_COUNT_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_count_insert AFTER INSERT ON word
+    BEGIN{_adjust_word_count('NEW.classification', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_count_update AFTER UPDATE OF classification ON word
+    WHEN OLD.classification IS NOT NEW.classification
+    BEGIN{_adjust_word_count('OLD.classification', -1)}{_adjust_word_count('NEW.classification', 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_count_delete AFTER DELETE ON word
+    BEGIN{_adjust_word_count('OLD.classification', -1)}
+    END""",
+]
+
+WORD_CATALOG_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_catalog_insert AFTER INSERT ON word
+    BEGIN{_bump_catalog_version('NEW.classification')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_catalog_update AFTER UPDATE ON word
+    BEGIN{_bump_catalog_version('OLD.classification')}{_bump_catalog_version('NEW.classification')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_word_catalog_delete AFTER DELETE ON word
+    BEGIN{_bump_catalog_version('OLD.classification')}
+    END""",
+]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_word_catalog_triggers(target, connection, **kwargs):
+    for trigger in WORD_CATALOG_TRIGGERS + WORD_COUNT_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+class LedgerHead(db.Model):
+    __tablename__ = 'ledger_head'
+
+    # 词力值账本的链头，只有一行；追加交易时以 CAS 方式更新，防止链分叉
+    ledger_head_id = db.Column(db.Integer, primary_key=True)
+    head_hash = db.Column(db.String(100), nullable=False)
+    tx_count = db.Column(db.Integer, nullable=False, default=0) # 通过账本追加的交易数
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class LedgerCheckpoint(db.Model):
+    __tablename__ = 'ledger_checkpoint'
+
+    # 账本检查点: 每 CHECKPOINT_BLOCK_SIZE 笔交易一个区块，记录区块的 Merkle 根和 HMAC 签名
+    ledger_checkpoint_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    start_tx_id = db.Column(db.Integer, nullable=False)
+    end_tx_id = db.Column(db.Integer, nullable=False, unique=True) # 按 end_tx_id 定位交易所在区块
+    tx_count = db.Column(db.Integer, nullable=False)
+    start_previous_hash = db.Column(db.String(100), nullable=False) # 区块第一笔交易的 previous_hash
+    end_hash = db.Column(db.String(100), nullable=False) # 区块最后一笔交易的 current_hash
+    merkle_root = db.Column(db.String(64), nullable=False)
+    signature = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+class ImageJob(db.Model):
+    __tablename__ = 'image_job'
+    __table_args__ = (
+        db.Index('ix_image_job_status_locked_until', 'status', 'locked_until'),  # 扫描待执行和租约过期的任务
+        db.Index('ix_image_job_updated_at', 'updated_at'),  # 清理过期任务
+    )
+
+    # 图片生成任务: pending -> running -> done / failed
+    image_job_id = db.Column(db.String(16), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False) # word_image / cover_image
+    params = db.Column(db.Text, nullable=False) # JSON
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    result = db.Column(db.Text) # JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    locked_until = db.Column(db.DateTime) # 执行中任务的租约，过期未完成的任务会被重新执行
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class ChatSummary(db.Model):
+    __tablename__ = 'chat_summary'
+
+    # 会话早期消息的摘要，超出上下文预算的历史用摘要代替
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    agent_id = db.Column(db.Integer, db.ForeignKey('ai_agent.agent_id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False) # 摘要覆盖到的最后一条消息
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
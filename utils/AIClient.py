@@ -0,0 +1,160 @@
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BIGMODEL_CHAT_URL = 'https://open.bigmodel.cn/api/paas/v4/chat/completions'
+BIGMODEL_IMAGE_URL = 'https://open.bigmodel.cn/api/paas/v4/images/generations'
+COZE_WORKFLOW_URL = 'https://api.coze.cn/v1/workflow/run'
+DEFAULT_CHAT_MODEL = 'glm-4-flash-250414'
+WORD_IMAGE_WORKFLOW_ID = '7542144636219932715'
+
+
+def _build_session():
+    """构建进程内共享的 HTTP 会话，复用到上游的 keep-alive 连接"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 4)),  # 缓存的上游主机数
+        pool_maxsize=int(os.getenv('UPSTREAM_POOL_MAXSIZE', 50)),  # 每个主机最多保持的连接数，与 worker_connections 对齐
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# 每个 worker 进程一个连接池，所有请求共享
+http_session = _build_session()
+
+
+def bigmodel_headers():
+    return {
+        'Authorization': f'Bearer {os.getenv("ZHIPUAI_API_KEY", "6eb6de30d0c6bab295e8730d7a8a71a0.gbET8XqExYOb99Ni")}',
+        'Content-Type': 'application/json'
+    }
+
+
+def upstream_proxies():
+    # 添加代理配置（如果需要）
+    return {
+        'http': 'http://127.0.0.1:33210',
+        'https': 'http://127.0.0.1:33210'
+    } if os.getenv('USE_PROXY', 'false').lower() == 'true' else None
+
+
+def chat_completion(messages, model=DEFAULT_CHAT_MODEL, timeout=15):
+    """一次性获取完整回复，返回 choices[0].message"""
+    response = http_session.post(
+        BIGMODEL_CHAT_URL,
+        json={"model": model, "messages": messages},
+        headers=bigmodel_headers(),
+        proxies=upstream_proxies(),
+        timeout=timeout
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"AI接口请求失败，状态码: {response.status_code}")
+
+    response_data = response.json()
+    if not response_data or not response_data.get('choices') or not response_data['choices'][0].get('message'):
+        raise Exception('AI接口返回数据格式不正确')
+    return response_data['choices'][0]['message']
+
+
+def open_chat_stream(messages, model=DEFAULT_CHAT_MODEL, timeout=(5, 60)):
+    """
+    以流式模式请求上游，只等到响应头返回即交给调用方
+    timeout: (连接超时, 两个数据块之间的最长间隔)
+    """
+    response = http_session.post(
+        BIGMODEL_CHAT_URL,
+        json={"model": model, "messages": messages, "stream": True},
+        headers=bigmodel_headers(),
+        proxies=upstream_proxies(),
+        timeout=timeout,
+        stream=True
+    )
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"AI接口请求失败，状态码: {response.status_code}")
+    return response
+
+
+def iter_chat_stream(response):
+    """逐个产出上游 SSE 中的增量文本，结束后把连接归还连接池"""
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            line = line.decode('utf-8')
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            choices = chunk.get('choices') or []
+            if not choices:
+                continue
+            content = (choices[0].get('delta') or {}).get('content')
+            if content:
+                yield content
+    finally:
+        response.close()
+
+
+def sse_event(data, event=None):
+    """格式化一条 Server-Sent Event"""
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {payload}\n\n"
+
+
+def generate_cover_image(prompt, timeout=30):
+    """cogview 生成故事封面，返回图片 URL"""
+    response = http_session.post(
+        BIGMODEL_IMAGE_URL,
+        json={
+            "model": "cogview-3-flash",
+            "prompt": prompt,
+            "quality": "standard",
+            "size": "1344x768"
+        },
+        headers=bigmodel_headers(),
+        proxies=upstream_proxies(),
+        timeout=timeout
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"AI图像生成接口请求失败，状态码: {response.status_code}")
+
+    response_data = response.json()
+    if not response_data or not response_data.get('data') or not response_data['data'][0].get('url'):
+        raise Exception('AI接口返回的图像数据格式不正确')
+    return response_data['data'][0]['url']
+
+
+def generate_word_image(word, timeout=15):
+    """Coze 工作流生成单词插图，返回工作流输出中的 data"""
+    response = http_session.post(
+        COZE_WORKFLOW_URL,
+        json={
+            'workflow_id': WORD_IMAGE_WORKFLOW_ID,
+            'parameters': {
+                'input': word
+            }
+        },
+        headers={
+            'Authorization': f'Bearer {os.getenv("COZE_API_KEY", "pat_qgBj4YOM9z2Ur5NGBF1cYicN40kH6IeZpnmYv4sZOfQa81R8CFo6aMeGqFxxK0jn")}',
+            'Content-Type': 'application/json'
+        },
+        timeout=timeout
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"AI图像生成接口请求失败，状态码: {response.status_code}")
+
+    response_data = response.json()
+    if response_data['code'] != 0:
+        raise Exception(f"AI图像生成接口请求失败: {response_data['msg']}")
+    return json.loads(response_data['data'])["data"]
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+
+class ActivityCalendar:
+    """
+    按天索引的学习日历(位图)
+    第 i 位为 1 表示 start + i 天有学习记录，一年只占 46 字节
+    """
+
+    def __init__(self, start=None, bits=b''):
+        self.start = start
+        self._value = int.from_bytes(bits or b'', 'little')
+
+    @classmethod
+    def from_dates(cls, dates):
+        calendar = cls()
+        for day in sorted(set(dates)):
+            calendar.mark(day)
+        return calendar
+
+    def to_bytes(self):
+        return self._value.to_bytes((self._value.bit_length() + 7) // 8, 'little')
+
+    def mark(self, day):
+        """记录某天有学习，返回这一天之前是否没有记录"""
+        if self.start is None:
+            self.start = day
+        elif day < self.start:
+            # 出现比起始日更早的日期时整体左移
+            self._value <<= (self.start - day).days
+            self.start = day
+        bit = 1 << (day - self.start).days
+        if self._value & bit:
+            return False
+        self._value |= bit
+        return True
+
+    def has(self, day):
+        if self.start is None or day < self.start:
+            return False
+        return bool(self._value >> (day - self.start).days & 1)
+
+    def learning_days(self):
+        return bin(self._value).count('1')
+
+    def last_date(self):
+        if not self._value:
+            return None
+        return self.start + timedelta(days=self._value.bit_length() - 1)
+
+    def current_streak(self):
+        """最近一段连续学习的天数(以最后一个学习日结尾)"""
+        top = self._value.bit_length()
+        if not top:
+            return 0
+        zeros = ~self._value & ((1 << top) - 1)
+        if not zeros:
+            return top
+        return top - zeros.bit_length()
+
+    def longest_streak(self):
+        value, streak = self._value, 0
+        while value:
+            value &= value << 1
+            streak += 1
+        return streak
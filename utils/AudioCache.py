@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.CacheUtil import SingleFlight
+
+try:
+    import fcntl  # 跨进程文件锁，仅 Linux/macOS 可用
+except ImportError:
+    fcntl = None
+
+
+class AudioCache:
+    """
+    按 (text, voice, rate) 内容寻址的磁盘音频缓存
+    - 所有 gunicorn worker 共享同一个目录
+    - 同一个 key 的并发未命中只合成一次（进程内 SingleFlight + 进程间文件锁）
+    - 总大小超过 max_bytes 时按最近访问时间(mtime)淘汰
+    """
+
+    def __init__(self, folder, max_bytes, lock_timeout=30):
+        self.folder = os.path.abspath(folder)
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self._flight = SingleFlight()
+        self._size_lock = threading.Lock()
+        self._total_bytes = None  # 首次写入时扫描目录得到
+        os.makedirs(os.path.join(folder, 'locks'), exist_ok=True)
+
+    @staticmethod
+    def make_key(text, voice, rate):
+        raw = json.dumps([text, voice, rate], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.mp3")
+
+    def get_or_create(self, text, voice, rate, synthesize, attempts=3):
+        """
+        返回 (key, 已打开的文件对象, 文件大小)，由调用方负责关闭
+        synthesize(fp) 负责把音频写入打开的文件对象
+        文件打开后即使被其他 worker 淘汰(unlink)也能继续读完；打开前被淘汰则重新合成
+        """
+        key = self.make_key(text, voice, rate)
+        path = self.path_for(key)
+        for _ in range(attempts):
+            if not self._touch(path):
+                self._flight.do(key, lambda: self._fill(key, path, synthesize))
+            try:
+                fp = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            return key, fp, os.fstat(fp.fileno()).st_size
+        raise Exception('音频文件被淘汰，请重试')
+
+    def _touch(self, path):
+        """命中时刷新 mtime，作为 LRU 的访问时间"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _fill(self, key, path, synthesize):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 按 key 前缀分 256 把锁，避免为每个 key 留下一个锁文件
+        with self._file_lock(os.path.join(self.folder, 'locks', f"{key[:2]}.lock")):
+            # 拿到锁后再检查一次，其他 worker 可能已经合成完毕
+            if os.path.exists(path):
+                return
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as fp:
+                    synthesize(fp)
+                size = os.path.getsize(tmp_path)
+                if size == 0:
+                    raise Exception('音频合成结果为空')
+                os.replace(tmp_path, path)  # 原子替换，读者不会看到写了一半的文件
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self._account(size)
+
+    def _file_lock(self, lock_path):
+        cache = self
+
+        class _Lock:
+            def __enter__(self):
+                if fcntl is None:
+                    return self
+                self.fp = open(lock_path, 'w')
+                deadline = time.time() + cache.lock_timeout
+                while True:
+                    try:
+                        # 非阻塞 + 轮询，避免在 gevent worker 中阻塞整个进程
+                        fcntl.flock(self.fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        return self
+                    except BlockingIOError:
+                        if time.time() > deadline:
+                            self.fp.close()
+                            raise Exception('等待音频合成超时')
+                        time.sleep(0.05)
+
+            def __exit__(self, *exc):
+                if fcntl is not None:
+                    fcntl.flock(self.fp, fcntl.LOCK_UN)
+                    self.fp.close()
+
+        return _Lock()
+
+    def _account(self, added):
+        with self._size_lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += added
+            if self._total_bytes <= self.max_bytes:
+                return
+            self._total_bytes = self._evict()
+
+    def _scan_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if not name.endswith('.mp3'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._scan_entries())
+
+    def _evict(self):
+        """删除最久未访问的文件，直到总大小降到上限的 90%"""
+        entries = self._scan_entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                continue
+        return total
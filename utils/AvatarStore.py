@@ -0,0 +1,154 @@
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps  # 可选依赖，未安装时不生成缩略图，直接使用原图
+except ImportError:
+    Image = None
+
+THUMBNAIL_SIZES = (64, 128, 256)
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+class AvatarStore:
+    """
+    按内容 hash 存储的头像
+    - 原图保存为 <folder>/<sha256>.<扩展名>，相同的文件只存一份
+    - 后台在子进程中生成各尺寸的 WebP/JPEG 缩略图: <sha256>_<尺寸>.<webp|jpg>，线程池大小限制同时运行的子进程数
+    路径都是相对路径，与 static 目录的 URL 对应
+    """
+
+    def __init__(self, folder, max_workers=2):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='avatar')
+
+    def save(self, file, extension):
+        """
+        边写临时文件边计算 hash，返回 (原图路径, 备用文件)
+        内容相同的文件已存在时直接复用，临时文件作为备用文件保留，由 ensure 在数据库提交后处理
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            path = f"{self.folder}/{digest.hexdigest()}.{extension}"
+            if os.path.exists(path):
+                return path, tmp_path
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path, None
+
+    def ensure(self, path, spare):
+        """
+        数据库提交后调用: 复用的文件在提交前被 remove 删除时用备用文件恢复，否则删除备用文件
+        提交后 remove 重新检查引用时一定能看到这次上传，两者配合保证被引用的文件不会丢失
+        """
+        if not spare:
+            return
+        if os.path.exists(path):
+            os.remove(spare)
+        else:
+            os.replace(spare, path)
+
+    @staticmethod
+    def is_image(path):
+        """只读取文件头校验是否为图片，不解码像素；未安装 Pillow 时不校验"""
+        if Image is None:
+            return True
+        try:
+            with Image.open(path) as image:
+                image.verify()
+            return True
+        except Exception:
+            return False
+
+    def remove(self, path, is_referenced):
+        """
+        删除没有引用的原图及其缩略图
+        先把原图改名，再调用 is_referenced() 检查引用: 检查时已有用户引用则改回原名，
+        与 ensure 配合，并发上传相同内容时不会删掉刚被引用的文件
+        """
+        deleting = f"{path}.deleting"
+        try:
+            os.replace(path, deleting)
+        except FileNotFoundError:
+            return
+        if is_referenced():
+            os.replace(deleting, path)
+            return
+        for file_path in self.thumbnails_on_disk(path):
+            os.remove(file_path)
+        os.remove(deleting)
+
+    def thumbnails_on_disk(self, path):
+        return [thumbnail for thumbnail in (self.thumbnail_path(path, size, fmt)
+                                            for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS)
+                if os.path.exists(thumbnail)]
+
+    def thumbnail_path(self, path, size, fmt='jpg'):
+        return f"{os.path.splitext(path)[0]}_{size}.{fmt}"
+
+    def thumbnail_url(self, path, size=128, fmt='jpg'):
+        """返回已生成的缩略图路径，没有时(旧头像或还在生成)返回原图路径"""
+        if not path or not path.startswith(self.folder + '/'):
+            return path
+        thumbnail = self.thumbnail_path(path, size, fmt)
+        return thumbnail if os.path.exists(thumbnail) else path
+
+    def thumbnails(self, path):
+        return {f"{size}.{fmt}": self.thumbnail_url(path, size, fmt) for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS}
+
+    def schedule_thumbnails(self, path):
+        """提交缩略图生成任务，返回 Future"""
+        return self._executor.submit(self._thumbnails_in_subprocess, path)
+
+    def _thumbnails_in_subprocess(self, path):
+        # 解码和缩放是 CPU 密集的，gevent worker 中放在线程里也会阻塞其他请求；
+        # 子进程中生成，gevent 的 subprocess 已被协程化，等待时不阻塞
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-m', 'utils.AvatarStore', os.path.abspath(self.folder), os.path.abspath(path)],
+                       cwd=project_root, check=True)
+
+    def make_thumbnails(self, path):
+        """在当前进程中生成缺少的缩略图"""
+        if Image is None:
+            return
+        pending = [(size, fmt) for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS
+                   if not os.path.exists(self.thumbnail_path(path, size, fmt))]
+        if not pending:
+            return
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            # 从大到小缩放，每次在上一个尺寸的基础上缩小
+            for size in sorted({size for size, _ in pending}, reverse=True):
+                image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                for fmt in THUMBNAIL_FORMATS:
+                    if (size, fmt) in pending:
+                        self._write(image, self.thumbnail_path(path, size, fmt), THUMBNAIL_FORMATS[fmt])
+
+    def _write(self, image, path, fmt):
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, fmt, quality=85)
+        os.replace(tmp_path, path)
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('用法: python -m utils.AvatarStore 头像目录 原图路径')
+        sys.exit(1)
+    AvatarStore(sys.argv[1], max_workers=1).make_thumbnails(sys.argv[2])
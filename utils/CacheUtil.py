@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并同一个 key 的并发调用：只有第一个调用者真正执行，其余等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class TTLCache:
+    """线程安全的进程内缓存：条目超过 ttl 秒过期，超过 max_entries 时淘汰最久未使用的"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_create(self, key, fn, flight=None):
+        """未命中时调用 fn 生成并缓存；传入 SingleFlight 时同一个 key 的并发未命中只调用一次 fn"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def load():
+            # 上一轮调用可能在本次 get 之后刚写入缓存，真正调用前再查一次
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            result = fn()
+            self.set(key, result)
+            return result
+
+        return flight.do(key, load) if flight else load()
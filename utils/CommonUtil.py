@@ -1,5 +1,6 @@
 from flask import Flask
 import uuid
+from datetime import datetime
 
 
 def allowed_file(app: Flask, filename):
@@ -13,4 +14,16 @@ def generate_random_filename(original_filename):
     random_name = str(uuid.uuid4())
     if ext:
         return f"{random_name}.{ext}"
-    return random_name
\ No newline at end of file
+    return random_name
+
+
+def format_cursor(cursor):
+    """(created_at, id) 游标转成字符串返回给前端"""
+    created_at, row_id = cursor
+    return f"{created_at.isoformat(timespec='microseconds')}_{row_id}"
+
+
+def parse_cursor(text):
+    """解析 format_cursor 生成的游标，格式不对时抛出 ValueError"""
+    created_at, _, row_id = text.rpartition('_')
+    return datetime.fromisoformat(created_at), int(row_id)
@@ -0,0 +1,71 @@
+import hashlib
+
+# RFC 6962 的域分隔前缀: 叶子和内部节点使用不同的前缀，内部节点的 hash 不能冒充叶子
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(data):
+    return hashlib.sha256(LEAF_PREFIX + data.encode()).hexdigest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def transaction_leaf(tx):
+    """交易的 Merkle 叶子，tx 可以是 TradeTransaction 对象或查询出的行"""
+    created_at = tx.created_at.strftime('%Y-%m-%d %H:%M:%S.%f') if tx.created_at else ''
+    return leaf_hash(
+        f"{tx.trade_transaction_id}|{tx.sender}|{tx.receiver}|{tx.amount}|{created_at}|{tx.previous_hash}|{tx.current_hash}"
+    )
+
+
+def _split(n):
+    """小于 n 的最大 2 的幂"""
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+
+class MerkleTree:
+    """
+    RFC 6962 结构的 Merkle 树
+    n 个叶子按小于 n 的最大 2 的幂切分成左右子树，节点数为奇数时不复制最后一个节点；
+    构建时记录所有子树的 hash，生成证明只需按路径查表
+    """
+
+    def __init__(self, leaves):
+        self.leaves = list(leaves)
+        self._nodes = {}  # (start, end) -> 子树 hash
+        self.root = self._build(0, len(self.leaves))
+
+    def _build(self, start, end):
+        if end == start:
+            return hashlib.sha256(b'').hexdigest()
+        if end - start == 1:
+            value = self.leaves[start]
+        else:
+            middle = start + _split(end - start)
+            value = node_hash(self._build(start, middle), self._build(middle, end))
+        self._nodes[(start, end)] = value
+        return value
+
+    def proof(self, index):
+        """返回第 index 个叶子到根的路径 [{"hash", "position"}]，position 表示兄弟节点在左还是右"""
+        path = []
+        start, end = 0, len(self.leaves)
+        while end - start > 1:
+            middle = start + _split(end - start)
+            if index < middle:
+                path.append({"hash": self._nodes[(middle, end)], "position": 'right'})
+                end = middle
+            else:
+                path.append({"hash": self._nodes[(start, middle)], "position": 'left'})
+                start = middle
+        return path[::-1]
+
+
+def merkle_root(leaves):
+    return MerkleTree(leaves).root
@@ -0,0 +1,154 @@
+# 预压缩: 部署时运行 python -m utils.ModelAssets 模型目录 缓存目录，
+# 运行中模型变化时由子进程补齐，CPU 密集的压缩不在 gevent worker 进程内执行
+import gzip
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import brotli
+
+# 压缩后至少比原文件小这么多才保留压缩版本
+MIN_COMPRESSION_RATIO = 0.9
+# brotli 11 比 9 慢一个数量级，体积只小几个百分点
+COMPRESSORS = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=9),
+    'br': lambda data: brotli.compress(data, quality=9),
+}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelAssets:
+    """
+    3D 模型(.glb)资源清单
+    - 启动时扫描目录，记录每个模型的大小和 sha256，sha256 同时作为强 ETag 和带版本的 URL
+    - 模型文件增删或大小、修改时间变化时重新扫描，最多每 check_interval 秒检查一次；没变的文件不重新计算 hash
+    - 每个模型的 gzip/brotli 预压缩版本按 sha256 命名保存在 cache_folder，内容不变时直接复用；
+      部署时预先生成，缺少时由子进程生成
+    """
+
+    def __init__(self, folder, cache_folder, check_interval=5):
+        self.folder = os.path.abspath(folder)
+        self.cache_folder = os.path.abspath(cache_folder)
+        self.check_interval = check_interval
+        os.makedirs(self.cache_folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._compress_thread = None
+        self._checked_at = time.monotonic()
+        self._signature = self._stat_files()
+        self._manifest = self._scan(self._signature, {})
+
+    def _stat_files(self):
+        """目录中模型文件的 (名字, 大小, 修改时间)，用来判断目录是否变化"""
+        return tuple(sorted(
+            (entry.name[:-4], entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(self.folder) if entry.name.endswith('.glb') and entry.is_file()
+        ))
+
+    def _scan(self, signature, previous):
+        manifest = {}
+        for name, size, mtime in signature:
+            asset = previous.get(name)
+            if not asset or (asset['size'], asset['mtime']) != (size, mtime):
+                path = os.path.join(self.folder, f"{name}.glb")
+                asset = {'name': name, 'path': path, 'size': size, 'mtime': mtime, 'sha256': _file_sha256(path)}
+            manifest[name] = asset
+        return manifest
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            signature = self._stat_files()
+            if signature == self._signature:
+                return
+            self._manifest = self._scan(signature, self._manifest)
+            self._signature = signature
+        self.start_compression()
+
+    def get(self, name):
+        self._refresh()
+        return self._manifest.get(name)
+
+    def manifest(self):
+        """按名字排序的模型列表"""
+        self._refresh()
+        return list(self._manifest.values())
+
+    @staticmethod
+    def version(asset):
+        """带版本 URL 中使用的内容 hash"""
+        return asset['sha256'][:16]
+
+    def variant_path(self, asset, encoding):
+        return os.path.join(self.cache_folder, f"{asset['sha256']}.glb.{encoding}")
+
+    def encoded(self, asset, accept_encoding):
+        """按客户端支持的编码返回 (编码, 预压缩文件路径)，没有可用的压缩版本时返回 (None, 原文件路径)"""
+        accepted = {item.split(';')[0].strip() for item in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted:
+                path = self.variant_path(asset, encoding)
+                if os.path.exists(path):
+                    return encoding, path
+        return None, asset['path']
+
+    def pending_variants(self, asset):
+        return [encoding for encoding in COMPRESSORS
+                if not os.path.exists(self.variant_path(asset, encoding))
+                and not os.path.exists(self.variant_path(asset, encoding) + '.skip')]
+
+    def start_compression(self):
+        """有缺少压缩版本的模型时，后台启动子进程补齐"""
+        if not any(self.pending_variants(asset) for asset in self.manifest()):
+            return
+        if self._compress_thread and self._compress_thread.is_alive():
+            return
+        self._compress_thread = threading.Thread(target=self._compress_in_subprocess, name='model-compress', daemon=True)
+        self._compress_thread.start()
+
+    def _compress_in_subprocess(self):
+        # gevent worker 中 subprocess 已被协程化，等待子进程时不阻塞其他请求
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-m', 'utils.ModelAssets', self.folder, self.cache_folder], cwd=project_root)
+
+    def compress_all(self):
+        """在当前进程中生成所有缺少的压缩版本"""
+        for asset in self.manifest():
+            pending = self.pending_variants(asset)
+            if not pending:
+                continue
+            with open(asset['path'], 'rb') as f:
+                data = f.read()
+            for encoding in pending:
+                compressed = COMPRESSORS[encoding](data)
+                # 压缩效果不明显时留下标记文件，下次启动不再尝试
+                path = self.variant_path(asset, encoding)
+                if len(compressed) > len(data) * MIN_COMPRESSION_RATIO:
+                    path += '.skip'
+                    compressed = b''
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('用法: python -m utils.ModelAssets 模型目录 缓存目录')
+        sys.exit(1)
+    ModelAssets(sys.argv[1], sys.argv[2]).compress_all()
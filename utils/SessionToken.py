@@ -0,0 +1,47 @@
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+
+class SessionError(Exception):
+    """令牌无效或过期，status_code 为返回给前端的状态码"""
+
+    def __init__(self, message, status_code=401):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SessionTokens:
+    """
+    服务端签发的会话令牌，签名和有效期都在本地校验，不需要访问微信接口或数据库
+    - access 令牌有效期短，用于恢复登录状态
+    - refresh 令牌有效期长，只能用来换新的令牌；令牌中记录签发时用户的会话代数，由调用方校验后作废
+    """
+
+    def __init__(self, secret, access_ttl=7 * 24 * 3600, refresh_ttl=90 * 24 * 3600):
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self._serializer = URLSafeTimedSerializer(secret, salt='vocalbuddy-session')
+
+    def issue(self, user_id, generation):
+        return {
+            "access_token": self._serializer.dumps({"uid": user_id, "typ": "access"}),
+            "refresh_token": self._serializer.dumps({"uid": user_id, "typ": "refresh", "gen": generation}),
+            "expires_in": self.access_ttl,
+        }
+
+    def verify(self, token, kind='access'):
+        """校验令牌，返回 user_id；refresh 令牌返回 (user_id, 会话代数)"""
+        if not token:
+            raise SessionError("Missing token")
+        try:
+            payload = self._serializer.loads(token, max_age=self.access_ttl if kind == 'access' else self.refresh_ttl)
+        except SignatureExpired:
+            raise SessionError("Token expired")
+        except BadSignature:
+            raise SessionError("Invalid token")
+        if payload.get("typ") != kind:
+            raise SessionError("Invalid token")
+        if kind == 'refresh':
+            if "gen" not in payload:
+                raise SessionError("Token revoked")
+            return payload["uid"], payload["gen"]
+        return payload["uid"]
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+
+from flask import Response
+from sqlalchemy import select
+
+from sql_alchemy import db, Word, WordCatalogVersion, word_payload
+
+# 占位符: 响应中这个位置替换为预序列化的单词列表
+WORDS_PLACEHOLDER = '\x00words\x00'
+
+
+def dumps(data):
+    # 与 flask jsonify 在生产环境下的输出格式保持一致
+    return json.dumps(data, ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+
+def json_response(data, fragments):
+    """把 data 中的 WORDS_PLACEHOLDER 替换为预序列化的单词片段，返回 JSON 响应"""
+    body = dumps(data).replace(dumps(WORDS_PLACEHOLDER), '[' + ','.join(fragments) + ']', 1) + '\n'
+    return Response(body, mimetype='application/json')
+
+
+class WordCatalog:
+    """
+    进程内的词库缓存
+    按词书懒加载，每个单词保存解析好的 payload 和序列化好的 JSON 片段；
+    词书版本号(由触发器维护)变化时重新加载，版本号最多每 check_interval 秒查询一次；
+    只缓存有单词的词书，其他 classification 返回空词书，不占用内存
+    """
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self._books = {}  # classification -> {'version', 'checked_at', 'payloads', 'fragments', 'word_ids'}
+        self._known = (0, frozenset())  # (查询时间, 有单词的词书)
+        self._lock = threading.Lock()
+
+    def classifications(self):
+        """有单词的词书名称，最多每 check_interval 秒查询一次"""
+        checked_at, known = self._known
+        now = time.time()
+        if now - checked_at >= self.check_interval:
+            known = frozenset(db.session.execute(
+                select(WordCatalogVersion.classification).where(WordCatalogVersion.word_count > 0)
+            ).scalars())
+            self._known = (now, known)
+        return known
+
+    def _current_version(self, classification):
+        return db.session.query(WordCatalogVersion.version).filter_by(classification=classification).scalar() or 0
+
+    def book(self, classification):
+        now = time.time()
+        book = self._books.get(classification)
+        if book and now - book['checked_at'] < self.check_interval:
+            return book
+        if classification not in self.classifications():
+            self._books.pop(classification, None)  # 词书已清空
+            return {'version': 0, 'checked_at': now, 'payloads': {}, 'fragments': {}, 'word_ids': []}
+
+        version = self._current_version(classification)
+        if book and book['version'] == version:
+            book['checked_at'] = now
+            return book
+
+        with self._lock:
+            book = self._books.get(classification)
+            if book and book['version'] == version:
+                return book
+            book = self._load(classification, version)
+            self._books[classification] = book
+            return book
+
+    def _load(self, classification, version):
+        rows = db.session.execute(
+            select(Word.word_id, Word.word_en, Word.word_cn, Word.usphone, Word.example_sentense_en,
+                   Word.example_sentense_cn, Word.picture)
+            .where(Word.classification == classification)
+            .order_by(Word.word_id)
+        ).all()
+        payloads = {row.word_id: word_payload(row) for row in rows}
+        return {
+            'version': version,
+            'checked_at': time.time(),
+            'payloads': payloads,
+            'fragments': {word_id: dumps(payload) for word_id, payload in payloads.items()},
+            'word_ids': [row.word_id for row in rows],
+        }
+
+    def invalidate(self, classification):
+        with self._lock:
+            self._books.pop(classification, None)
+
+    def payloads(self, classification, word_ids):
+        """返回单词 payload(只读，需要修改时先复制)"""
+        payloads = self.book(classification)['payloads']
+        return [payloads[word_id] for word_id in word_ids if word_id in payloads]
+
+    def fragments(self, classification, word_ids):
+        fragments = self.book(classification)['fragments']
+        return [fragments[word_id] for word_id in word_ids if word_id in fragments]
+
+
+word_catalog = WordCatalog()
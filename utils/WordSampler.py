@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+
+from utils.WordCatalog import word_catalog
+
+
+class WordSampler:
+    """
+    游客模式的随机单词
+    每个有单词的词书(classification 为 None 时为全部词书)在内存中保留一个打乱顺序的单词池，池中直接存序列化好的 JSON 片段；
+    抽样时取随机起点开始的连续 count 个，不查数据库。
+    池每 refresh_interval 秒或词书内容变化时由一个请求重新打乱，其他请求继续使用旧池
+    """
+
+    def __init__(self, catalog=word_catalog, pool_size=5000, refresh_interval=300):
+        self.catalog = catalog
+        self.pool_size = pool_size
+        self.refresh_interval = refresh_interval
+        self._pools = {}  # classification -> {'fragments', 'books', 'built_at'}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def _classifications(self, classification):
+        if classification:
+            return [classification]
+        return sorted(self.catalog.classifications())
+
+    def _build(self, classification):
+        books = {name: self.catalog.book(name) for name in self._classifications(classification)}
+        candidates = [(name, word_id) for name, book in books.items() for word_id in book['word_ids']]
+        sample = self._rng.sample(candidates, min(self.pool_size, len(candidates)))
+        return {
+            'fragments': [books[name]['fragments'][word_id] for name, word_id in sample],
+            'books': books,
+            'built_at': time.monotonic(),
+        }
+
+    def _is_stale(self, pool):
+        if time.monotonic() - pool['built_at'] >= self.refresh_interval:
+            return True
+        # 词书重新加载后 book 对象会换成新的
+        return any(self.catalog.book(name) is not book for name, book in pool['books'].items())
+
+    def _pool(self, classification):
+        pool = self._pools.get(classification)
+        if pool and not self._is_stale(pool):
+            return pool
+        if pool and not self._lock.acquire(blocking=False):
+            return pool  # 其他线程正在重建，先用旧池
+        if not pool:
+            self._lock.acquire()
+        try:
+            current = self._pools.get(classification)
+            if current is pool or current is None:
+                current = self._build(classification)
+                self._pools[classification] = current
+            return current
+        finally:
+            self._lock.release()
+
+    def draw(self, count=10, classification=None):
+        """返回 count 个随机单词的 JSON 片段，classification 不是有单词的词书时抛出 ValueError"""
+        if classification and classification not in self.catalog.classifications():
+            raise ValueError(f"未知的词书: {classification}")
+        fragments = self._pool(classification)['fragments']
+        if len(fragments) <= count:
+            return list(fragments)
+        start = self._rng.randrange(len(fragments))
+        end = start + count
+        return fragments[start:end] if end <= len(fragments) else fragments[start:] + fragments[:end - len(fragments)]
+
+
+word_sampler = WordSampler()